@@ -1,37 +1,46 @@
+from typing import Iterator
+
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnablePassthrough
-from langchain_core.output_parsers import StrOutputParser
 
-# Summarizer using context
-def summarize(content: str) -> str:
-    prompt = ChatPromptTemplate([
+from agents.map_reduce import map_reduce
+
+# Summarizer over every chunk in the project
+def summarize(chunks, llm, max_new_chunks: int | None = None, stream: bool = False) -> str | Iterator[str]:
+    map_prompt = ChatPromptTemplate.from_messages([
+        ("system", "You are a professional summarizer. Provide a clear, concise summary."),
+        ("human", "Summarize the following document excerpt:\n\n{content}")
+    ])
+    reduce_prompt = ChatPromptTemplate.from_messages([
         ("system", "You are a professional summarizer. Provide a clear, concise summary."),
-        ("human", f"Summarize the following content:\n\n{content}")
+        ("human", "Combine these partial summaries of the same document set into one summary, without repeating points:\n\n{content}")
     ])
-    print("Prompt for summarization:", prompt)
-    return prompt
-    """chain = prompt | llm
-    return chain.invoke({"content": content})"""
+    return map_reduce("summarize", chunks, llm, map_prompt, reduce_prompt, max_new_chunks, stream)
 
-# KPI Extractor
-def extract_kpis(content: str) -> str:
-    prompt = ChatPromptTemplate.from_messages([
+# KPI Extractor over every chunk in the project
+def extract_kpis(chunks, llm, max_new_chunks: int | None = None, stream: bool = False) -> str | Iterator[str]:
+    map_prompt = ChatPromptTemplate.from_messages([
         ("system", "You are an expert analyst. Extract and list key KPIs and numeric metrics."),
-        ("human", f"Extract KPIs and important numbers from the following content:\n\n{content}")
+        ("human", "Extract KPIs and important numbers from the following document excerpt. Reply 'None' if there are none:\n\n{content}")
     ])
-    return prompt
-    """chain = prompt | llm
-    return chain.invoke({"content": content})"""
+    reduce_prompt = ChatPromptTemplate.from_messages([
+        ("system", "You are an expert analyst. Extract and list key KPIs and numeric metrics."),
+        ("human", "Merge these KPI lists into one list, removing duplicates and 'None' entries:\n\n{content}")
+    ])
+    return map_reduce("extract_kpis", chunks, llm, map_prompt, reduce_prompt, max_new_chunks, stream)
 
-# Report Generation based on context and topic
-def generate_report(context: str) -> str:
-    prompt = ChatPromptTemplate.from_messages([
+# Report Generation over every chunk in the project, focused on a topic
+def generate_report(chunks, llm, topic: str = "", max_new_chunks: int | None = None, stream: bool = False) -> str | Iterator[str]:
+    # The map step notes the key facts of each excerpt independent of the topic, so its
+    # outputs are cached and reused across reports; the topic only shapes the reduce.
+    map_prompt = ChatPromptTemplate.from_messages([
+        ("system", "You are a business analyst. Take concise notes of the key facts, figures and findings."),
+        ("human", "Take notes on the following document excerpt:\n\n{content}")
+    ])
+    reduce_prompt = ChatPromptTemplate.from_messages([
         ("system", "You are a business report writer. Write a structured, formal report."),
-        ("human", f"Based on the following context, generate a brief report:\n\n{context}")
+        ("human", "Based on the following notes, generate a brief report on: {topic}\n\n{content}")
     ])
-    return prompt
-    """chain = prompt | llm
-    return chain.invoke({"topic": topic, "context": context})"""
+    return map_reduce("generate_report", chunks, llm, map_prompt, reduce_prompt, max_new_chunks, stream, topic=topic)
 
 # Simulated Web Search (for web-related queries)
 def search_web(query: str) -> str:
@@ -0,0 +1,212 @@
+"""Map-reduce over every chunk of a project, for tools that must see the whole corpus.
+
+Each chunk is mapped by its own LLM call (cached by task and chunk hash, so repeat runs
+and incremental uploads only map new chunks), then the map outputs are reduced in
+token-bounded groups, level by level, until one answer remains.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Iterator
+
+import tiktoken
+from langchain_core.output_parsers import StrOutputParser
+
+from core import rag
+from core.tracing import span
+
+MAP_CACHE_NAME = ".map_cache.sqlite"
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # The encoding is downloaded on first use; fall back to an estimate when offline
+        print(f"Warning: tiktoken encoding unavailable, estimating token counts. Error: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    return len(encoding.encode(text, disallowed_special=())) if encoding else len(text) // 4 + 1
+
+
+class MapCache:
+    """Persistent map outputs keyed by (task key, chunk hash), shared by every project."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS map_outputs ("
+                " task_key TEXT NOT NULL,"
+                " chunk_hash TEXT NOT NULL,"
+                " output TEXT NOT NULL,"
+                " PRIMARY KEY (task_key, chunk_hash))"
+            )
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def get_many(self, task_key: str, hashes: list[str]) -> dict[str, str]:
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        with self._lock, self._connect() as conn:
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT chunk_hash, output FROM map_outputs WHERE task_key = ? AND chunk_hash IN ({placeholders})",
+                    [task_key, *batch],
+                )
+                found.update(rows)
+        return found
+
+    def put(self, task_key: str, chunk_hash: str, output: str):
+        with self._lock, self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO map_outputs (task_key, chunk_hash, output) VALUES (?, ?, ?)", (task_key, chunk_hash, output))
+
+
+class _TokenBudget:
+    """Caps the prompt tokens of map calls in flight, process-wide (across tools and sessions)."""
+
+    def __init__(self, max_tokens: int):
+        self.max_tokens = max_tokens
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, tokens: int):
+        with self._cond:
+            # A single call larger than the budget still runs, just on its own
+            while self.in_flight and self.in_flight + tokens > self.max_tokens:
+                self._cond.wait()
+            self.in_flight += tokens
+
+    def release(self, tokens: int):
+        with self._cond:
+            self.in_flight -= tokens
+            self._cond.notify_all()
+
+
+_map_budget = _TokenBudget(rag.config["map_tokens_in_flight"])
+_map_cache = None
+_map_cache_lock = threading.Lock()
+
+
+def get_map_cache() -> MapCache | None:
+    global _map_cache
+    with _map_cache_lock:
+        if _map_cache is None:
+            try:
+                _map_cache = MapCache(os.path.join(rag.VECTOR_STORE_BASE_PATH, MAP_CACHE_NAME))
+            except Exception as e:
+                print(f"Warning: Map cache unavailable, every chunk will be mapped. Error: {e}")
+        return _map_cache
+
+
+class NeedsConfirmation(str):
+    """A tool result asking to confirm a large full-corpus run: shown to the user, but never cached or recorded as an answer."""
+
+
+def _task_key(task: str, map_prompt, llm) -> str:
+    """Identifies map outputs by task, prompt wording and model, so editing a prompt invalidates them."""
+    model = getattr(llm, "deployment_name", None) or getattr(llm, "model_name", None) or llm._llm_type
+    prompt_text = [message.prompt.template for message in map_prompt.messages]
+    return hashlib.sha256(json.dumps([task, prompt_text, model]).encode("utf-8")).hexdigest()
+
+
+def _reduce_groups(texts: list[str], max_tokens: int) -> list[list[str]]:
+    """Packs texts in order into groups of at most max_tokens (each group holds at least two texts)."""
+    groups, current, used = [], [], 0
+    for text in texts:
+        tokens = count_tokens(text)
+        if current and used + tokens > max_tokens and len(current) > 1:
+            groups.append(current)
+            current, used = [], 0
+        current.append(text)
+        used += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+
+def map_reduce(task: str, chunks, llm, map_prompt, reduce_prompt, max_new_chunks: int | None = None,
+               stream: bool = False, **reduce_inputs) -> str | Iterator[str]:
+    """Runs map_prompt over every chunk and reduces the outputs with reduce_prompt.
+
+    chunks are rag.ChunkRefs: cached map outputs are looked up by content hash, and text is
+    loaded only for the chunks still to map, as their calls are submitted. If more than
+    max_new_chunks need mapping, nothing is run and a NeedsConfirmation message is returned.
+    map_prompt takes {content}; reduce_prompt takes {content} plus reduce_inputs (e.g. topic).
+    Map calls run concurrently under a shared in-flight token budget. With stream, the
+    final reduce call is returned as an iterator of its tokens (messages stay plain str).
+    """
+    chunks = sorted(chunks, key=lambda ref: (str(ref.metadata.get("project", "")), str(ref.metadata.get("source", "")), ref.metadata.get("page", 0)))
+    if not chunks:
+        return "No documents are indexed for this project yet."
+
+    map_chain = map_prompt | llm | StrOutputParser()
+    reduce_chain = reduce_prompt | llm | StrOutputParser()
+    cache = get_map_cache()
+    task_key = _task_key(task, map_prompt, llm)
+    hashes = [ref.chunk_hash for ref in chunks]
+    outputs = cache.get_many(task_key, hashes) if cache else {}
+    missing = {ref.chunk_hash: ref for ref in chunks if ref.chunk_hash not in outputs}
+    if max_new_chunks and len(missing) > max_new_chunks:
+        return NeedsConfirmation(
+            f"This would map {len(missing)} of {len(chunks)} chunk(s) with one model call each, more than the"
+            f" limit of {max_new_chunks}. Repeat the request with \"confirm\" to run it anyway."
+        )
+
+    def map_one(chunk_hash, text, tokens):
+        try:
+            output = map_chain.invoke({"content": text})
+        finally:
+            _map_budget.release(tokens)
+        if cache:
+            cache.put(task_key, chunk_hash, output)  # Written as it completes, so an interrupted run resumes
+        return chunk_hash, output
+
+    with span(f"map.{task}", chunks=len(chunks), mapped=len(missing)):
+        print(f"{task}: mapping {len(missing)} of {len(chunks)} chunk(s) ({len(chunks) - len(missing)} cached)...")
+        with ThreadPoolExecutor(max_workers=rag.config["map_concurrency"]) as pool:
+            futures = []
+            for chunk_hash, ref in missing.items():
+                text = ref.load()
+                if text is None:
+                    continue  # Deleted since it was listed
+                tokens = count_tokens(text)
+                # Blocks while the budget is spent, so only the text of calls in flight is held
+                _map_budget.acquire(tokens)
+                futures.append(pool.submit(map_one, chunk_hash, text, tokens))
+            for future in futures:
+                chunk_hash, output = future.result()
+                outputs[chunk_hash] = output
+
+    texts = [outputs[h] for h in dict.fromkeys(hashes) if h in outputs]
+    if not texts:
+        return "No documents are indexed for this project yet."
+    with span(f"reduce.{task}", inputs=len(texts)) as s:
+        level = 0
+        while True:
+            groups = _reduce_groups(texts, rag.config["reduce_tokens"])
+            level += 1
+            if stream and len(groups) == 1:
+                s.set(levels=level)
+                return reduce_chain.stream({"content": "\n\n---\n\n".join(groups[0]), **reduce_inputs})
+            with ThreadPoolExecutor(max_workers=rag.config["map_concurrency"]) as pool:
+                texts = list(pool.map(lambda group: reduce_chain.invoke({"content": "\n\n---\n\n".join(group), **reduce_inputs}), groups))
+            if len(texts) == 1:
+                break
+        s.set(levels=level)
+    return texts[0]
@@ -1,23 +1,32 @@
 # agents/tool_agent.py
 
-from typing import Callable, Dict
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator
+
+from agents.map_reduce import NeedsConfirmation
+from core.rag import config, iter_retriever_chunks
+from core.tracing import span
 
 # Placeholder for actual tools
 TOOLS: Dict[str, Callable] = {}
 
+# Tools that map-reduce over every chunk of the project (the rest only need the user input)
+CONTEXT_TOOLS = {"summarize", "extract_kpis", "generate_report"}
+
+# The whole word "confirm" lifts RAG_MAP_MAX_CHUNKS for a turn ("confirmed orders" doesn't)
+CONFIRM_RE = re.compile(r"\bconfirm\b", re.IGNORECASE)
+
 def register_tools(tool_dict: Dict[str, Callable]):
     """Register external tool functions."""
     global TOOLS
     TOOLS = tool_dict
 
 
-def decide_and_act(user_input: str, rag_chain) -> str:
-    """
-    Parses user input, decides which tools to use, and invokes them with context.
-    """
+def detect_actions(user_input: str) -> list[str]:
+    """Returns the tools whose intent keywords appear in the user input."""
     actions = []
-
-    # --- Detect intents ---
     if "summarize" in user_input.lower():
         actions.append("summarize")
     if "kpi" in user_input.lower() or "compare" in user_input.lower():
@@ -26,22 +35,107 @@ def decide_and_act(user_input: str, rag_chain) -> str:
         actions.append("generate_report")
     if "search" in user_input.lower() or "latest" in user_input.lower():
         actions.append("search_web")
+    return actions
 
-    # --- Default: fallback to RAG if no tool matches ---
-    if not actions:
-        return rag_chain.invoke(user_input)
 
-    # --- Execute each tool and collect responses ---
-    combined_response = ""
-    for action in actions:
+def _run_tool(action: str, user_input: str, chunks: list, llm, confirm: bool, stream: bool = False):
+    """Runs one tool and returns (result, seconds taken)."""
+    start = time.perf_counter()
+    # Full-corpus tools stop short of mapping more uncached chunks than the limit unless confirmed
+    max_new_chunks = None if confirm else config["map_max_chunks"]
+    with span(f"tool.{action}"):
         if action == "search_web":
             result = TOOLS[action](user_input)
+        elif action == "generate_report":
+            result = TOOLS[action](chunks, llm, topic=user_input, max_new_chunks=max_new_chunks, stream=stream)
         else:
-            context = rag_chain.invoke(user_input)
-            if action == "generate_report":
-                result = TOOLS[action](user_input, context)
-            else:
-                result = TOOLS[action](context)
-        combined_response += f"### {action.replace('_', ' ').title()} Result:\n{result}\n\n"
-    print(f"Combined response from tools: {combined_response}")
-    return combined_response
+            result = TOOLS[action](chunks, llm, max_new_chunks=max_new_chunks, stream=stream)
+    return result, time.perf_counter() - start
+
+
+def _section_header(action: str) -> str:
+    return f"### {action.replace('_', ' ').title()} Result:\n"
+
+
+def _format_section(action: str, result: str) -> str:
+    section = f"{_section_header(action)}{result}\n\n"
+    return NeedsConfirmation(section) if isinstance(result, NeedsConfirmation) else section
+
+
+def execute_plan(user_input: str, actions: list[str], retriever, llm, timings: dict, confirm: bool = False,
+                 stream: bool = False) -> Iterator[tuple[str, str]]:
+    """
+    Executes a turn's tools: lists the project's chunks once (by hash and metadata; tools
+    load the text of the chunks they map), runs the tools concurrently, and yields
+    (action, result) in plan order. Per-stage seconds are recorded in timings.
+    confirm (or the word "confirm" in the input) lets tools map more than RAG_MAP_MAX_CHUNKS chunks.
+    With stream, full-corpus tools may yield an iterator of their final reduce call's tokens.
+    """
+    confirm = confirm or bool(CONFIRM_RE.search(user_input))
+    chunks = []
+    if any(action in CONTEXT_TOOLS for action in actions):
+        start = time.perf_counter()
+        with span("list_chunks") as s:
+            chunks = list(iter_retriever_chunks(retriever))
+            s.set(chunks=len(chunks))
+        timings["list_chunks"] = time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=len(actions)) as pool:
+        futures = [(action, pool.submit(_run_tool, action, user_input, chunks, llm, confirm, stream)) for action in actions]
+        for action, future in futures:
+            result, elapsed = future.result()
+            timings[action] = elapsed
+            yield action, result
+
+
+def decide_and_act(user_input: str, rag_chain, retriever, llm, timings: dict | None = None, confirm: bool = False) -> str:
+    """
+    Parses user input, decides which tools to use, and invokes them with context.
+    Returns a NeedsConfirmation if a tool asked to confirm a large run (see execute_plan).
+    """
+    timings = {} if timings is None else timings
+    start = time.perf_counter()
+
+    # --- Detect intents ---
+    actions = detect_actions(user_input)
+
+    # --- Default: fallback to RAG if no tool matches ---
+    if not actions:
+        with span("rag_chain"):
+            response = rag_chain.invoke(user_input)
+        timings["rag_chain"] = time.perf_counter() - start
+    else:
+        # --- Execute tools concurrently over a single retrieval and merge their results ---
+        sections = [_format_section(action, result) for action, result in execute_plan(user_input, actions, retriever, llm, timings, confirm)]
+        response = "".join(sections)
+        if any(isinstance(section, NeedsConfirmation) for section in sections):
+            response = NeedsConfirmation(response)
+
+    timings["total"] = time.perf_counter() - start
+    print(f"Turn timings (s): { {name: round(t, 3) for name, t in timings.items()} }")
+    return response
+
+
+def stream_decide_and_act(user_input: str, rag_chain, retriever, llm, timings: dict | None = None, confirm: bool = False) -> Iterator[str]:
+    """
+    Streaming variant of decide_and_act: yields answer tokens for plain questions, and
+    for tools their section header once the map step is done, then the tokens of the
+    final reduce call as they arrive. A request to confirm a large run is yielded whole,
+    as a NeedsConfirmation.
+    """
+    timings = {} if timings is None else timings
+    actions = detect_actions(user_input)
+
+    if not actions:
+        yield from rag_chain.stream(user_input)
+        return
+
+    for action, result in execute_plan(user_input, actions, retriever, llm, timings, confirm, stream=True):
+        if isinstance(result, str):
+            yield _format_section(action, result)
+            continue
+        start = time.perf_counter()
+        yield _section_header(action)
+        yield from result
+        yield "\n\n"
+        timings[action] += time.perf_counter() - start
@@ -1,14 +1,27 @@
 import streamlit as st
 import os
 import time
+import uuid
+from agents import agent_logic  # noqa: F401 (registers the tools once per process)
+from agents.map_reduce import NeedsConfirmation
+from agents.tool_agent import decide_and_act, stream_decide_and_act
+from core.jobs import DELETE, DONE, QUEUED, RUNNING, JobQueue
+from core.manifest import MANIFEST_NAME
 from core.rag import (
-    create_or_update_vector_store,
-    get_retriever_for_project,
-    load_documents,
+    answer_cache,
+    cache_answer,
+    delete_documents,
+    get_federated_retriever,
+    get_vector_store_path,
+    ingest_files,
+    list_documents,
+    lookup_cached_answer,
     setup_rag_chain,
+    timed_stream,
 )
+from core.store_cache import index_signature
+from core.tracing import llm_callbacks
 from core.utils import load_config
-from langchain_openai import AzureChatOpenAI
 
 # --- Page Config ---
 st.set_page_config(page_title="RAG Assistant (Azure)", layout="wide")
@@ -16,18 +29,26 @@ st.title("📄 Multi-Project RAG Assistant (Azure OpenAI)")
 st.write("Upload documents to a project and ask questions based on their content.")
 
 # --- Load Config and Initialize LLM ---
-config = load_config()
+config = load_config()  # Cached per process
+
+@st.cache_resource
+def get_llm():
+    """Process-wide Azure chat client, created once rather than on every rerun."""
+    from langchain_openai import AzureChatOpenAI  # Deferred: pulls in the openai SDK
+    return AzureChatOpenAI(
+        openai_api_version=config["azure_api_version"],
+        azure_endpoint=config["azure_endpoint"],
+        azure_deployment=config["azure_chat_deployment"],
+        openai_api_key=config["azure_api_key"],
+        temperature=0.5, # Low temp for factual Q&A
+        max_retries=2,
+        callbacks=llm_callbacks(),
+    )
+
 llm = None
 if all([config.get("azure_endpoint"), config.get("azure_api_key"), config.get("azure_api_version"), config.get("azure_chat_deployment")]):
     try:
-        llm = AzureChatOpenAI(
-            openai_api_version=config["azure_api_version"],
-            azure_endpoint=config["azure_endpoint"],
-            azure_deployment=config["azure_chat_deployment"],
-            openai_api_key=config["azure_api_key"],
-            temperature=0.5, # Low temp for factual Q&A
-            max_retries=2,
-        )
+        llm = get_llm()
         st.sidebar.success("Azure LLM Initialized.")
     except Exception as e:
         st.sidebar.error(f"LLM Init Error: {e}")
@@ -44,6 +65,46 @@ os.makedirs(VECTOR_STORE_BASE_PATH, exist_ok=True)
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
 
+@st.cache_resource
+def get_job_queue() -> JobQueue:
+    """Process-wide queue of uploads and deletions; its workers start once and resume jobs left over from a restart."""
+    queue = JobQueue(os.path.join(VECTOR_STORE_BASE_PATH, ".jobs.sqlite"), num_workers=config["ingest_workers"])
+    queue.start(ingest_files, delete_documents)
+    return queue
+
+job_queue = get_job_queue()
+
+
+@st.cache_data(ttl=5, show_spinner=False)
+def list_projects() -> list[str]:
+    """Project folders inside /data, re-listed at most every few seconds."""
+    return [d for d in os.listdir(VECTOR_STORE_BASE_PATH) if os.path.isdir(os.path.join(VECTOR_STORE_BASE_PATH, d))]
+
+@st.cache_data(show_spinner=False)
+def cached_documents(project_id: str, manifest_version: int) -> dict[str, int]:
+    """A project's documents; manifest_version (the manifest's mtime) keys the cache."""
+    return list_documents(project_id)
+
+def manifest_version(project_id: str) -> int:
+    try:
+        return os.stat(os.path.join(get_vector_store_path(project_id), MANIFEST_NAME)).st_mtime_ns
+    except OSError:
+        return 0
+
+@st.cache_resource(max_entries=32, show_spinner=False)
+def get_rag_resources(projects: tuple[str, ...], _llm):
+    """(retriever, chain) for a set of indexed projects, shared by all sessions.
+
+    The retrievers hold no store: each query fetches the current index through the
+    process-wide store cache, so entries here stay small and never pin an old version.
+    """
+    retriever = get_federated_retriever(list(projects))
+    if not retriever:
+        # Raised rather than returned, so the failure isn't cached
+        raise ValueError(f"Could not load the index of project(s) {', '.join(projects)}.")
+    return retriever, setup_rag_chain(_llm, retriever)
+
+
 # --- Session State Initialization ---
 if "current_project" not in st.session_state:
     st.session_state.current_project = "default_project"
@@ -61,7 +122,7 @@ st.sidebar.header("Project Management")
 st.sidebar.header("Project Management")
 
 # List all existing projects (folders inside /data)
-existing_projects = [d for d in os.listdir(VECTOR_STORE_BASE_PATH) if os.path.isdir(os.path.join(VECTOR_STORE_BASE_PATH, d))]
+existing_projects = list_projects()
 
 # Let user select from existing or enter a new one
 selected_project = st.sidebar.selectbox("Select Existing Project", existing_projects, index=existing_projects.index(st.session_state.current_project) if st.session_state.current_project in existing_projects else 0) if existing_projects else None
@@ -87,11 +148,29 @@ st.sidebar.write(f"**Current Project:** `{project_name}`")
 if project_name not in st.session_state.messages:
     st.session_state.messages[project_name] = []
 
+# Other projects searched together with the current one (e.g. all quarterly filings)
+extra_projects = st.sidebar.multiselect(
+    "Also search these projects",
+    [p for p in existing_projects if p != project_name],
+    key=f"extra_projects_{project_name}",
+    help="Questions are answered from the current project and every project selected here.",
+)
+search_projects = [project_name, *extra_projects]
+if search_projects != st.session_state.get("search_projects"):
+    st.session_state.search_projects = search_projects
+    st.session_state.rag_chain = None  # Rebuild the retriever over the new set of shards
+    st.session_state.retriever_ready = False
+
 
 # --- File Upload Sidebar ---
 st.sidebar.subheader("Upload Documents")
 if "uploaded_files_processed" not in st.session_state:
     st.session_state.uploaded_files_processed = {}
+# Set up before the upload handler, which records the jobs it queues here
+if "ingest_jobs" not in st.session_state:
+    st.session_state.ingest_jobs = {}  # project -> ids of jobs this session is waiting on
+if "ingest_notices" not in st.session_state:
+    st.session_state.ingest_notices = []
 
 # Initialize project-specific processed flag
 if project_name not in st.session_state.uploaded_files_processed:
@@ -106,57 +185,88 @@ uploaded_files = st.sidebar.file_uploader(
 
 if uploaded_files and not st.session_state.uploaded_files_processed[project_name]:
     file_paths = []
-    all_processed_successfully = True
-
-    with st.spinner(f"Processing {len(uploaded_files)} file(s) for '{project_name}'..."):
-        for uploaded_file in uploaded_files:
-            temp_path = os.path.join(UPLOAD_FOLDER, f"{project_name}_{uploaded_file.name}")
-            try:
-                with open(temp_path, "wb") as f:
-                    f.write(uploaded_file.getbuffer())
-                file_paths.append(temp_path)
-            except Exception as e:
-                st.sidebar.error(f"Error saving {uploaded_file.name}: {e}")
-                all_processed_successfully = False
-
-        if file_paths:
-            try:
-                loaded_docs = load_documents(file_paths)
-                if loaded_docs:
-                    success = create_or_update_vector_store(project_name, loaded_docs)
-                    if success:
-                        st.sidebar.success(f"Processed {len(file_paths)} file(s). Project '{project_name}' updated.")
-                        st.session_state.rag_chain = None  # Force reload of retriever/chain
-                        st.session_state.retriever_ready = False
-                        st.session_state.uploaded_files_processed[project_name] = True
-                        st.rerun()
-                    else:
-                        st.sidebar.error("Vector store update failed. Check logs.")
-                        all_processed_successfully = False
-                else:
-                    st.sidebar.warning("No text could be extracted from the uploaded files.")
-                    all_processed_successfully = False
-            except Exception as e:
-                st.sidebar.error(f"Error during processing: {e}")
-                all_processed_successfully = False
-            finally:
-                for p in file_paths:
-                    if os.path.exists(p):
-                        try:
-                            os.remove(p)
-                        except Exception as e_rem:
-                            print(f"Warning: could not remove temp file {p}. Error: {e_rem}")
+    upload_id = uuid.uuid4().hex[:8]
+
+    # One folder per upload keeps the original file names, which identify documents in the project manifest
+    upload_dir = os.path.join(UPLOAD_FOLDER, f"{project_name}_{upload_id}")
+    os.makedirs(upload_dir, exist_ok=True)
+    for uploaded_file in uploaded_files:
+        # Kept until the ingestion job finishes, so the job can resume after a restart
+        upload_path = os.path.join(upload_dir, uploaded_file.name)
+        try:
+            with open(upload_path, "wb") as f:
+                f.write(uploaded_file.getbuffer())
+            file_paths.append(upload_path)
+        except Exception as e:
+            st.sidebar.error(f"Error saving {uploaded_file.name}: {e}")
+
+    if file_paths:
+        # Parsing, chunking and embedding run in the background worker; the chat stays usable meanwhile
+        job_id = job_queue.enqueue(project_name, file_paths)
+        st.session_state.ingest_jobs.setdefault(project_name, []).append(job_id)
+        st.session_state.uploaded_files_processed[project_name] = True
+        st.sidebar.info(f"Queued {len(file_paths)} file(s) for '{project_name}'. You can keep chatting while they are processed.")
 
 elif uploaded_files and st.session_state.uploaded_files_processed[project_name]:
     st.sidebar.info("These files were already processed.")
 
+
+# --- Background Ingestion Progress ---
+
+@st.fragment(run_every="2s")
+def show_ingest_progress(project_name: str):
+    """Polls this session's ingestion jobs and reloads the chain once one completes."""
+    pending = st.session_state.ingest_jobs.get(project_name, [])
+    for job_id in list(pending):
+        job = job_queue.get(job_id)
+        if job and job["status"] in (QUEUED, RUNNING):
+            st.progress(job["progress"], text=job["message"] or f"Job {job['status']}...")
+            continue
+        pending.remove(job_id)
+        if job and job["status"] == DONE:
+            st.session_state.ingest_notices.append(("success", f"{job['message']} Project '{project_name}' updated."))
+        else:
+            st.session_state.ingest_notices.append(("error", job["message"] if job else "Ingestion job not found."))
+        st.session_state.rag_chain = None  # Force reload of retriever/chain
+        st.session_state.retriever_ready = False
+        st.rerun()
+
+for level, notice in st.session_state.ingest_notices:
+    getattr(st.sidebar, level)(notice)
+st.session_state.ingest_notices = []
+
+if st.session_state.ingest_jobs.get(project_name):
+    with st.sidebar:
+        show_ingest_progress(project_name)
+
+# --- Indexed Documents ---
+documents = cached_documents(project_name, manifest_version(project_name))
+if documents:
+    with st.sidebar.expander(f"Documents ({len(documents)})"):
+        st.caption("Re-uploading a document with the same name replaces it; unchanged files are skipped.")
+        for doc_name, n_chunks in documents.items():
+            name_col, delete_col = st.columns([4, 1])
+            name_col.write(f"{doc_name} · {n_chunks} chunk(s)")
+            if delete_col.button("🗑️", key=f"delete_{project_name}_{doc_name}", help=f"Remove {doc_name} from the project"):
+                # Waits for the project's write lock in a background worker, like an upload, so the UI never blocks on an ingest
+                job_id = job_queue.enqueue(project_name, [doc_name], kind=DELETE)
+                st.session_state.ingest_jobs.setdefault(project_name, []).append(job_id)
+                st.session_state.ingest_notices.append(("info", f"Queued removal of {doc_name} from '{project_name}'."))
+                st.rerun()
+
 # --- Setup RAG Chain for Current Project ---
 if not st.session_state.rag_chain and llm:
-    retriever = get_retriever_for_project(project_name)
+    indexed_projects = tuple(p for p in search_projects if index_signature(get_vector_store_path(p)))
+    try:
+        retriever, rag_chain = get_rag_resources(indexed_projects, llm) if indexed_projects else (None, None)
+    except ValueError as e:
+        print(e)
+        retriever = None
     if retriever:
-        st.session_state.rag_chain = setup_rag_chain(llm, retriever)
+        st.session_state.rag_chain = rag_chain
+        st.session_state.retriever = retriever  # Used by the agent to retrieve once per turn
         st.session_state.retriever_ready = True
-        st.sidebar.info(f"Ready to answer questions for project '{project_name}'.")
+        st.sidebar.info(f"Ready to answer questions for project(s) {', '.join(repr(p) for p in search_projects)}.")
     else:
         # No retriever means no data or error loading
         st.sidebar.warning(f"No document data found or loaded for '{project_name}'. Upload files.")
@@ -166,7 +276,28 @@ elif not llm:
      st.session_state.retriever_ready = False
 
 
+# --- Answer Cache Metrics ---
+with st.sidebar.expander("Answer cache"):
+    cache_metrics = answer_cache.metrics()
+    st.write(f"Hits: {cache_metrics['hits']} · Misses: {cache_metrics['misses']} · Hit rate: {cache_metrics['hit_rate']:.0%}")
+    st.write(f"Latency saved: {cache_metrics['saved_seconds']:.1f}s · Cached answers: {cache_metrics['entries']}")
+
 # --- Chat Interface ---
+stream_responses = st.sidebar.toggle("Stream responses", value=True, help="Show the answer token by token as it is generated.")
+
+def render_stream(chunks, placeholder) -> str:
+    """Writes a token stream into a placeholder as it arrives and returns the full text.
+
+    The text is a NeedsConfirmation if any part of it was.
+    """
+    text, needs_confirmation = "", False
+    for chunk in chunks:
+        text += chunk
+        needs_confirmation = needs_confirmation or isinstance(chunk, NeedsConfirmation)
+        placeholder.markdown(text + "▌")
+    placeholder.markdown(text)
+    return NeedsConfirmation(text) if needs_confirmation else text
+
 st.subheader(f"Ask questions about documents in Project: `{project_name}`")
 
 # Display chat messages
@@ -174,18 +305,6 @@ for message in st.session_state.messages[project_name]:
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
 
-from agents.tool_agent import register_tools, decide_and_act
-from agents.agent_logic import summarize, extract_kpis, generate_report, search_web
-register_tools({
-    "summarize": summarize,
-    "extract_kpis": extract_kpis,
-    "generate_report": generate_report,
-    "search_web": search_web,
-})
-
-
-from agents.tool_agent import decide_and_act  # Import your agent function for decision-making
-
 # Accept user input
 if prompt := st.chat_input(f"Ask about '{project_name}' docs..."):
     # Add user message to project's chat history
@@ -198,6 +317,15 @@ if prompt := st.chat_input(f"Ask about '{project_name}' docs..."):
         message_placeholder = st.empty()
         full_response = ""
 
+        # Reuse a previous answer for the same (or a near-duplicate) question when the index hasn't changed
+        cached_response, query_vector = None, None
+        # Cached answers are per project, so multi-project questions always go to the chain
+        if st.session_state.rag_chain and st.session_state.retriever_ready and len(search_projects) == 1:
+            try:
+                cached_response, query_vector = lookup_cached_answer(project_name, prompt)
+            except Exception as e:
+                print(f"Warning: answer cache lookup failed. Error: {e}")
+
         if not st.session_state.rag_chain:
             full_response = "Error: RAG chain not initialized. Cannot generate response."
             st.error(full_response)
@@ -206,21 +334,38 @@ if prompt := st.chat_input(f"Ask about '{project_name}' docs..."):
             full_response = f"Error: Document retriever for project '{project_name}' is not ready. Please upload documents and wait for processing."
             st.warning(full_response)
 
+        elif cached_response:
+            full_response = cached_response
+            message_placeholder.markdown(full_response)
+            st.caption("Answered from cache.")
+
+        elif stream_responses:
+            try:
+                timings = {}
+                full_response = render_stream(
+                    timed_stream(stream_decide_and_act(prompt, st.session_state.rag_chain, st.session_state.retriever, llm, timings), timings),
+                    message_placeholder,
+                )
+                st.caption(f"First token: {timings['ttft']:.2f}s · Total: {timings['total']:.2f}s")
+                print(f"Turn timings (s): { {name: round(t, 3) for name, t in timings.items()} }")
+                # A request to confirm a large run isn't an answer: caching it would outlive the confirmed run
+                if not isinstance(full_response, NeedsConfirmation):
+                    cache_answer(project_name, query_vector, full_response, timings["total"])
+
+            except Exception as e:
+                full_response = f"An error occurred: {e}"
+                st.error(full_response)
+
         else:
             with st.spinner("Thinking based on documents..."):
                 try:
-                    # First, check if an agent tool should handle it
-                    tool_response = decide_and_act(prompt, st.session_state.rag_chain)
-
-                    if tool_response:  # If a tool handled it, we show that response
-                        full_response = st.session_state.rag_chain.invoke(tool_response)
-                        print("Tool response:", tool_response)
-                    else:
-                        # Otherwise, fall back to standard RAG QA using the retriever chain
-                        rag_response = st.session_state.rag_chain.invoke(prompt)
-                        full_response = rag_response
-
+                    # The agent either runs its tools over one shared retrieval or falls back to standard RAG QA
+                    timings = {}
+                    full_response = decide_and_act(prompt, st.session_state.rag_chain, st.session_state.retriever, llm, timings)
                     message_placeholder.markdown(full_response)
+                    st.caption(f"Total: {timings['total']:.2f}s")
+                    if not isinstance(full_response, NeedsConfirmation):
+                        cache_answer(project_name, query_vector, full_response, timings["total"])
 
                 except Exception as e:
                     full_response = f"An error occurred: {e}"
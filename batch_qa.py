@@ -0,0 +1,219 @@
+"""Headless batch question answering over one or more projects.
+
+Usage:
+    python batch_qa.py questions.jsonl [--out answers.jsonl] [--workers 8]
+                       [--per-project 2] [--per-deployment 4] [--deployment NAME] [--confirm]
+
+Each input line is a JSON object with "project" and "question", plus optional "id"
+and "deployment" (the Azure chat deployment; defaults to AZURE_OPENAI_CHAT_DEPLOYMENT_NAME).
+Answers are appended to --out as JSON lines as soon as each one finishes, with
+per-stage timings. Re-running the same command skips questions that already have a
+successful answer in --out, so an interrupted batch resumes where it stopped.
+Summaries, KPIs and reports that would map more than RAG_MAP_MAX_CHUNKS uncached chunks
+are recorded with status "needs_confirmation" (and retried on resume) unless --confirm is given.
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+
+from langchain_openai import AzureChatOpenAI
+
+from agents import agent_logic  # noqa: F401 (registers the tools)
+from agents.map_reduce import NeedsConfirmation
+from agents.tool_agent import decide_and_act
+from core.rag import get_retriever_for_project, setup_rag_chain
+from core.tracing import llm_callbacks
+from core.utils import load_config
+
+config = load_config()
+
+
+def make_llm(deployment: str):
+    """Azure chat client for one deployment, configured like the app's."""
+    return AzureChatOpenAI(
+        openai_api_version=config["azure_api_version"],
+        azure_endpoint=config["azure_endpoint"],
+        azure_deployment=deployment,
+        openai_api_key=config["azure_api_key"],
+        temperature=0.5,
+        max_retries=2,
+        callbacks=llm_callbacks(),
+    )
+
+
+def question_id(item: dict) -> str:
+    """The item's "id", or a stable hash of project, deployment and question."""
+    if item.get("id") is not None:
+        return str(item["id"])
+    key = json.dumps([item["project"], item.get("deployment"), item["question"]])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+
+def read_questions(path: str) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def completed_ids(out_path: str) -> set[str]:
+    """Ids already answered successfully in an earlier (possibly interrupted) run."""
+    done = set()
+    if not os.path.exists(out_path):
+        return done
+    with open(out_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Partial last line from an interrupted write
+            if record.get("status") == "ok":
+                done.add(record["id"])
+    return done
+
+
+def _ends_mid_line(path: str) -> bool:
+    with open(path, "rb") as f:
+        if f.seek(0, os.SEEK_END) == 0:
+            return False
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) != b"\n"
+
+
+class _Resources:
+    """Loads each project's retriever, and each (project, deployment) chain, once per batch.
+
+    Each project's store is held for the whole batch too: the store cache finds a store
+    still referenced here, so one larger than its budget isn't reloaded for every question.
+    """
+
+    def __init__(self, llm_factory):
+        self.llm_factory = llm_factory
+        self._built = {}
+        self._locks = defaultdict(threading.Lock)
+        self._guard = threading.Lock()
+
+    def _once(self, key, factory):
+        # Per-key lock: loading one project's index doesn't block questions on other projects
+        with self._guard:
+            lock = self._locks[key]
+        with lock:
+            if key not in self._built:
+                self._built[key] = factory()
+            return self._built[key]
+
+    def get(self, project_id: str, deployment: str):
+        llm = self._once(("llm", deployment), lambda: self.llm_factory(deployment))
+        retriever = self._once(("retriever", project_id), lambda: get_retriever_for_project(project_id))
+        if retriever is None:
+            raise ValueError(f"No index found for project '{project_id}'.")
+        self._once(("store", project_id), lambda: retriever.vector_store)
+        chain = self._once(("chain", project_id, deployment), lambda: setup_rag_chain(llm, retriever))
+        return chain, retriever, llm
+
+
+def run_batch(questions: list[dict], out_path: str, workers: int = 8, per_project: int = 2, per_deployment: int = 4,
+              deployment: str | None = None, llm_factory=make_llm, confirm: bool = False) -> dict:
+    """Answers questions concurrently and appends one JSON line per answer to out_path.
+
+    At most per_project questions run against a project, and at most per_deployment
+    against an LLM deployment, at any time. Questions already answered in out_path are
+    skipped. confirm lets tools map more than RAG_MAP_MAX_CHUNKS chunks. Returns counts
+    of answered, failed and skipped questions.
+    """
+    deployment = deployment or config["azure_chat_deployment"]
+    done = completed_ids(out_path)
+    pending = deque()
+    for item in questions:
+        item = {**item, "id": question_id(item), "deployment": item.get("deployment") or deployment}
+        if item["id"] not in done:
+            pending.append(item)
+    skipped = len(questions) - len(pending)
+    total = len(pending)
+    print(f"Answering {total} question(s), skipping {skipped} already answered.")
+
+    resources = _Resources(llm_factory)
+    running = {"project": defaultdict(int), "deployment": defaultdict(int)}
+    counts = {"answered": 0, "failed": 0, "skipped": skipped}
+    cond = threading.Condition()
+    write_lock = threading.Lock()
+
+    def next_item():
+        # First pending question whose project and deployment both have a free slot
+        with cond:
+            while True:
+                if not pending:
+                    return None
+                for item in pending:
+                    if running["project"][item["project"]] < per_project and running["deployment"][item["deployment"]] < per_deployment:
+                        pending.remove(item)
+                        running["project"][item["project"]] += 1
+                        running["deployment"][item["deployment"]] += 1
+                        return item
+                cond.wait()
+
+    def answer(item: dict) -> dict:
+        record = {key: item[key] for key in ("id", "project", "deployment", "question")}
+        timings = {}
+        start = time.perf_counter()
+        try:
+            chain, retriever, llm = resources.get(item["project"], item["deployment"])
+            timings["setup"] = time.perf_counter() - start
+            answer = decide_and_act(item["question"], chain, retriever, llm, timings, confirm=confirm)
+            if isinstance(answer, NeedsConfirmation):
+                record["status"], record["error"] = "needs_confirmation", str(answer)
+            else:
+                record["answer"], record["status"] = answer, "ok"
+        except Exception as e:
+            record["status"], record["error"] = "error", f"{type(e).__name__}: {e}"
+        timings["wall"] = time.perf_counter() - start
+        record["timings"] = {name: round(seconds, 4) for name, seconds in timings.items()}
+        return record
+
+    def worker():
+        while (item := next_item()) is not None:
+            try:
+                record = answer(item)
+            finally:
+                with cond:
+                    running["project"][item["project"]] -= 1
+                    running["deployment"][item["deployment"]] -= 1
+                    cond.notify_all()
+            with write_lock:
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+                counts["answered" if record["status"] == "ok" else "failed"] += 1
+                finished = counts["answered"] + counts["failed"]
+                print(f"[{finished}/{total}] {record['project']}: {record['status']} in {record['timings']['wall']:.2f}s")
+
+    with open(out_path, "a", encoding="utf-8") as out:
+        if _ends_mid_line(out_path):
+            out.write("\n")  # Closes the partial line of an interrupted write, so the next record isn't glued to it
+        threads = [threading.Thread(target=worker, name=f"batch-qa-{i}") for i in range(max(1, min(workers, total)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of questions against project indexes.")
+    parser.add_argument("questions", help="JSONL file with one {\"project\", \"question\"} object per line")
+    parser.add_argument("--out", default="answers.jsonl", help="JSONL file answers are appended to (and resumed from)")
+    parser.add_argument("--workers", type=int, default=8, help="Questions answered concurrently in total")
+    parser.add_argument("--per-project", type=int, default=2, help="Concurrent questions per project")
+    parser.add_argument("--per-deployment", type=int, default=4, help="Concurrent questions per chat deployment")
+    parser.add_argument("--deployment", help="Default chat deployment for questions that don't name one")
+    parser.add_argument("--confirm", action="store_true", help="Let summaries, KPIs and reports map more than RAG_MAP_MAX_CHUNKS chunks")
+    args = parser.parse_args()
+
+    counts = run_batch(read_questions(args.questions), args.out, args.workers, args.per_project, args.per_deployment, args.deployment,
+                       confirm=args.confirm)
+    print(f"Done: {counts['answered']} answered, {counts['failed']} failed, {counts['skipped']} skipped. Results in {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Synthetic text corpora for benchmarks, reproducible from a seed."""
+import os
+
+import numpy as np
+
+TICKERS = ("MSFT", "AAPL", "GOOG", "AMZN", "NVDA", "TSLA")
+KPIS = ("EBITDA-margin", "ARR", "churn-rate", "gross-margin", "EPS", "free-cash-flow")
+
+
+def _vocabulary(size: int, rng) -> list[str]:
+    letters = np.array(list("abcdefghijklmnopqrstuvwxyz"))
+    return ["".join(rng.choice(letters, rng.integers(3, 10))) for _ in range(size)]
+
+
+def generate_corpus(directory: str, n_docs: int, words_per_doc: int = 3000, seed: int = 0) -> list[str]:
+    """Writes n_docs text files of Zipf-distributed words mixed with identifiers; returns their paths."""
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    vocabulary = _vocabulary(5000, rng)
+    paths = []
+    for i in range(n_docs):
+        ranks = np.minimum(rng.zipf(1.3, words_per_doc), len(vocabulary)) - 1
+        words = [vocabulary[r] for r in ranks]
+        # Sprinkle exact identifiers the way financial reports contain them
+        for position in rng.integers(0, words_per_doc, words_per_doc // 50):
+            words[position] = f"{rng.choice(KPIS)} {rng.choice(TICKERS)} clause-{rng.integers(1, 20)}.{rng.integers(1, 9)}"
+        path = os.path.join(directory, f"doc_{i:05d}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            for start in range(0, words_per_doc, 120):
+                f.write(" ".join(words[start:start + 120]) + ".\n\n")
+        paths.append(path)
+    return paths
+
+
+def sample_queries(n: int, seed: int = 1) -> list[str]:
+    """Questions mixing natural language with identifiers from the corpus."""
+    rng = np.random.default_rng(seed)
+    templates = (
+        "What was the {kpi} for {ticker}?",
+        "Which clause {clause} applies to {ticker}?",
+        "How did {kpi} change compared to the prior year?",
+    )
+    return [
+        templates[i % len(templates)].format(
+            kpi=rng.choice(KPIS), ticker=rng.choice(TICKERS), clause=f"{rng.integers(1, 20)}.{rng.integers(1, 9)}"
+        )
+        for i in range(n)
+    ]
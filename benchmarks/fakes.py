@@ -0,0 +1,79 @@
+"""Deterministic local stand-ins for AzureOpenAIEmbeddings and AzureChatOpenAI.
+
+Both produce the same output for the same input and can simulate service latency,
+so benchmark numbers reflect this project's code rather than network conditions.
+"""
+import hashlib
+import threading
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+def _seed(text: str) -> int:
+    return int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+
+
+class FakeEmbeddings(Embeddings):
+    """Hash-seeded unit vectors with optional per-request and per-text latency."""
+
+    def __init__(self, dim: int = 1536, request_latency: float = 0.0, text_latency: float = 0.0):
+        self.dim = dim
+        self.request_latency = request_latency
+        self.text_latency = text_latency
+        self.requests = 0
+        self.texts = 0
+        self._lock = threading.Lock()
+
+    def _vector(self, text: str) -> list[float]:
+        vector = np.random.default_rng(_seed(text)).standard_normal(self.dim).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        with self._lock:
+            self.requests += 1
+            self.texts += len(texts)
+        if self.request_latency or self.text_latency:
+            time.sleep(self.request_latency + self.text_latency * len(texts))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+
+WORDS = ("revenue", "margin", "growth", "quarter", "guidance", "segment", "operating", "income",
+         "the", "increased", "declined", "compared", "to", "prior", "year", "driven", "by", "demand")
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model that replies with deterministic tokens after a simulated time-to-first-token."""
+
+    ttft: float = 0.05
+    token_latency: float = 0.002
+    n_tokens: int = 64
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _tokens(self, messages) -> list[str]:
+        rng = np.random.default_rng(_seed(str(messages[-1].content)))
+        return [f"{WORDS[i]} " for i in rng.integers(0, len(WORDS), self.n_tokens)]
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        tokens = self._tokens(messages)
+        time.sleep(self.ttft + self.token_latency * len(tokens))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.ttft)
+        for token in self._tokens(messages):
+            time.sleep(self.token_latency)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
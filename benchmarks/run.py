@@ -0,0 +1,240 @@
+"""Offline benchmark for ingestion, retrieval and end-to-end QA.
+
+Usage:
+    python -m benchmarks.run [--sizes 20,200] [--out bench.json] [--baseline old.json] [--tolerance 0.2]
+
+Everything runs against deterministic local stand-ins for the Azure clients and
+synthetic corpora in a temporary directory. Results are written as JSON; with
+--baseline, latency metrics that regressed by more than --tolerance are reported
+and the command exits with status 1.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from agents import map_reduce
+from benchmarks.corpus import generate_corpus, sample_queries
+from benchmarks.fakes import FakeChatModel, FakeEmbeddings
+from core import rag
+from core.embedding_cache import EmbeddingCache
+from core.embedding_engine import EmbeddingEngine
+from core.tracing import llm_callbacks
+
+
+def _rss_high_water_mb() -> float:
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / (1024 * 1024) if sys.platform == "darwin" else maxrss / 1024
+
+
+def _percentiles(samples: list[float]) -> dict:
+    ms = np.array(samples) * 1000
+    return {
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "mean_ms": float(ms.mean()),
+    }
+
+
+def _timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def bench_loading(files: list[str]) -> tuple[dict, list]:
+    corpus_mb = sum(os.path.getsize(f) for f in files) / (1024 * 1024)
+    pages, load_seconds = _timed(lambda: list(rag.iter_documents(files)))
+    chunks, chunk_seconds = _timed(lambda: list(rag.iter_chunks(pages)))
+    return {
+        "files": len(files),
+        "corpus_mb": corpus_mb,
+        "pages": len(pages),
+        "chunks": len(chunks),
+        "load_seconds": load_seconds,
+        "load_mb_per_s": corpus_mb / load_seconds,
+        "chunk_seconds": chunk_seconds,
+        "chunks_per_s": len(chunks) / chunk_seconds,
+        "rss_high_water_mb": _rss_high_water_mb(),
+    }, pages
+
+
+def bench_embedding(texts: list[str], request_latency: float, concurrency: int) -> dict:
+    fake = FakeEmbeddings(request_latency=request_latency)
+    engine = EmbeddingEngine(fake, max_concurrency=concurrency)
+    _, seconds = _timed(engine.embed, texts)
+    return {
+        "texts": len(texts),
+        "requests": fake.requests,
+        "embed_seconds": seconds,
+        "texts_per_s": len(texts) / seconds,
+        "rss_high_water_mb": _rss_high_water_mb(),
+    }
+
+
+def bench_index(project_id: str, pages: list) -> dict:
+    store_path = rag.get_vector_store_path(project_id)
+    ok, build_seconds = _timed(rag.create_or_update_vector_store, project_id, pages)
+    if not ok:
+        raise RuntimeError(f"Index build failed for {project_id}")
+    rag.store_cache.invalidate(store_path)
+    vector_store, load_seconds = _timed(rag.load_vector_store, store_path)
+    return {
+        "vectors": vector_store.index.ntotal,
+        "build_seconds": build_seconds,
+        "load_seconds": load_seconds,
+        "index_mb": sum(os.path.getsize(os.path.join(store_path, f)) for f in os.listdir(store_path)) / (1024 * 1024),
+        "rss_high_water_mb": _rss_high_water_mb(),
+    }
+
+
+def bench_queries(project_id: str, queries: list[str]) -> dict:
+    retriever = rag.get_retriever_for_project(project_id)
+    dense = rag.load_vector_store(rag.get_vector_store_path(project_id)).as_retriever(search_kwargs={"k": 4})
+    results = {}
+    for name, r in (("retriever", retriever), ("dense", dense)):
+        latencies = [_timed(r.invoke, q)[1] for q in queries]
+        results[name] = _percentiles(latencies)
+    return results
+
+
+def bench_turns(project_id: str, queries: list[str], llm) -> dict:
+    """Turn latencies; tool turns are reported cold (nothing mapped yet) and warm (every map output cached)."""
+    from agents import agent_logic  # noqa: F401 (registers the tools)
+    from agents.tool_agent import decide_and_act
+
+    retriever = rag.get_retriever_for_project(project_id)
+    chain = rag.setup_rag_chain(llm, retriever)
+    tool_template = "Summarize and report the KPIs: {q}"
+
+    def turn(user_input: str) -> float:
+        timings = {}
+        decide_and_act(user_input, chain, retriever, llm, timings)
+        return timings["total"]
+
+    # The map cache starts empty for each corpus, so the first tool turn maps every chunk
+    cold = turn(tool_template.format(q=queries[0]))
+    return {
+        "qa_turn": _percentiles([turn(q) for q in queries]),
+        "tool_turn_cold": {"total_seconds": cold},
+        "tool_turn_warm": _percentiles([turn(tool_template.format(q=q)) for q in queries]),
+    }
+
+
+def _fresh_caches(directory: str):
+    """Gives the embedding and map caches empty files, so no corpus size reuses another's results.
+
+    The corpora share a seed, so a larger one contains the smaller ones' documents.
+    """
+    os.makedirs(directory)
+    rag.set_embedding_cache(EmbeddingCache(os.path.join(directory, rag.EMBEDDING_CACHE_NAME)))
+    map_reduce._map_cache = map_reduce.MapCache(os.path.join(directory, map_reduce.MAP_CACHE_NAME))
+
+
+def run(sizes: list[int], args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="rag-bench-")
+    rag.VECTOR_STORE_BASE_PATH = os.path.join(workdir, "data")
+    os.makedirs(rag.VECTOR_STORE_BASE_PATH)
+    rag.set_embeddings(FakeEmbeddings(), deployment="benchmark-fake")
+    rag.config["map_max_chunks"] = 0  # Tool turns measure full-corpus runs, without the confirmation step
+    llm = FakeChatModel(ttft=args.llm_ttft, token_latency=args.llm_token_latency, callbacks=llm_callbacks())
+    queries = sample_queries(args.queries)
+
+    results = []
+    for n_docs in sizes:
+        print(f"--- Benchmarking corpus of {n_docs} documents ---")
+        files = generate_corpus(os.path.join(workdir, f"corpus_{n_docs}"), n_docs)
+        project_id = f"bench_{n_docs}"
+        _fresh_caches(os.path.join(workdir, f"caches_{n_docs}"))
+        loading, pages = bench_loading(files)
+        texts = [chunk.page_content for chunk in rag.iter_chunks(pages)]
+        results.append({
+            "docs": n_docs,
+            "loading": loading,
+            "embedding": bench_embedding(texts, args.embed_latency, rag.config["embed_concurrency"]),
+            "index": bench_index(project_id, pages),
+            "queries": bench_queries(project_id, queries),
+            "turns": bench_turns(project_id, queries[:args.turns], llm),
+        })
+    return {"meta": _meta(args), "results": results}
+
+
+def _meta(args) -> dict:
+    try:
+        revision = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        revision = ""
+    return {
+        "revision": revision,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.time(),
+        "settings": vars(args),
+    }
+
+
+def _latency_metrics(report: dict) -> dict:
+    """Flattens the lower-is-better metrics (seconds / milliseconds) of a report."""
+    flat = {}
+
+    def walk(prefix, value):
+        if isinstance(value, dict):
+            for key, item in value.items():
+                walk(f"{prefix}.{key}" if prefix else key, item)
+        elif prefix.endswith(("_seconds", "_ms")):
+            flat[prefix] = value
+
+    for result in report["results"]:
+        walk(f"docs={result['docs']}", {k: v for k, v in result.items() if k != "docs"})
+    return flat
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Returns descriptions of latency metrics that got slower than baseline by more than tolerance."""
+    current, previous = _latency_metrics(report), _latency_metrics(baseline)
+    return [
+        f"{name}: {previous[name]:.4f} -> {value:.4f} (+{(value / previous[name] - 1):.0%})"
+        for name, value in current.items()
+        if name in previous and previous[name] > 0 and value > previous[name] * (1 + tolerance)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark for ingestion, retrieval and QA.")
+    parser.add_argument("--sizes", default="20,200", help="Comma-separated corpus sizes (documents)")
+    parser.add_argument("--queries", type=int, default=200, help="Retrieval queries per corpus")
+    parser.add_argument("--turns", type=int, default=20, help="decide_and_act turns per corpus and turn type")
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="Simulated seconds per embedding request")
+    parser.add_argument("--llm-ttft", type=float, default=0.05, help="Simulated LLM time to first token")
+    parser.add_argument("--llm-token-latency", type=float, default=0.001, help="Simulated LLM seconds per token")
+    parser.add_argument("--out", default="bench.json", help="Where to write the JSON results")
+    parser.add_argument("--baseline", help="Previous results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown vs. baseline (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    report = run([int(size) for size in args.sizes.split(",")], args)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
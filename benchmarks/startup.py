@@ -0,0 +1,83 @@
+"""Measures start-up cost: cold import time of the app's modules and Streamlit script run time.
+
+Usage:
+    python -m benchmarks.startup [--runs 5] [--reruns 20] [--out startup.json]
+
+Cold imports run in fresh interpreters. Script runs use Streamlit's AppTest against
+app.py in this process: the first run includes module imports and resource set-up,
+later runs are the per-interaction overhead every widget change pays. Placeholder
+Azure settings are used where none are configured, so client construction is included
+(no request is sent until a question is asked).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+MODULES = ("core.rag", "agents.tool_agent", "app_imports")
+PLACEHOLDER_AZURE_SETTINGS = {
+    "AZURE_OPENAI_ENDPOINT": "https://placeholder.openai.azure.com/",
+    "AZURE_OPENAI_API_KEY": "placeholder",
+    "AZURE_OPENAI_API_VERSION": "2024-02-01",
+    "AZURE_OPENAI_CHAT_DEPLOYMENT_NAME": "placeholder-chat",
+    "AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME": "placeholder-embedding",
+}
+_IMPORT_SNIPPETS = {
+    "app_imports": "import streamlit, core.rag, core.jobs, agents.tool_agent",
+}
+
+
+def cold_import_seconds(module: str, runs: int) -> float:
+    """Median seconds to import a module in a fresh interpreter."""
+    statement = _IMPORT_SNIPPETS.get(module, f"import {module}")
+    code = f"import time; t = time.perf_counter(); {statement}; print(time.perf_counter() - t)"
+    samples = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+        samples.append(float(result.stdout.strip().splitlines()[-1]))
+    return float(np.median(samples))
+
+
+def script_run_seconds(reruns: int) -> dict:
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file("app.py", default_timeout=120)
+    start = time.perf_counter()
+    app.run()
+    first = time.perf_counter() - start
+    samples = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        app.run()
+        samples.append(time.perf_counter() - start)
+    ms = np.array(samples) * 1000
+    return {
+        "first_run_seconds": first,
+        "rerun_p50_ms": float(np.percentile(ms, 50)),
+        "rerun_p95_ms": float(np.percentile(ms, 95)),
+        "exceptions": [str(e.value) for e in app.exception],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold start and per-rerun overhead of the Streamlit app.")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per cold-import measurement")
+    parser.add_argument("--reruns", type=int, default=20, help="Script reruns to time after the first run")
+    parser.add_argument("--out", default="startup.json", help="Where to write the JSON results")
+    args = parser.parse_args()
+    for name, value in PLACEHOLDER_AZURE_SETTINGS.items():
+        os.environ.setdefault(name, value)
+
+    report = {f"import_{module}_seconds": cold_import_seconds(module, args.runs) for module in MODULES}
+    report.update(script_run_seconds(args.reruns))
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
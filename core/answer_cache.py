@@ -0,0 +1,86 @@
+import threading
+import time
+
+import numpy as np
+
+
+class AnswerCache:
+    """Per-project semantic cache of answers, keyed by the question's embedding.
+
+    A lookup hits when a cached question has cosine similarity >= threshold with the
+    new one. Entries expire after ttl_seconds, each project keeps at most max_entries
+    (least recently used are evicted), and a project's entries are dropped whenever its
+    index version changes.
+    """
+
+    def __init__(self, threshold: float = 0.95, ttl_seconds: float = 3600, max_entries: int = 256):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._projects = {}  # key -> {"version": ..., "entries": [entry, ...]}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _entries(self, key: str, version) -> list:
+        project = self._projects.get(key)
+        if project is None or project["version"] != version:
+            project = self._projects[key] = {"version": version, "entries": []}
+        now = time.time()
+        project["entries"] = [e for e in project["entries"] if now - e["created"] < self.ttl_seconds]
+        return project["entries"]
+
+    def lookup(self, key: str, query_vector, version=None) -> str | None:
+        """Returns the cached answer for the most similar question, or None."""
+        query = self._normalize(query_vector)
+        with self._lock:
+            entries = self._entries(key, version)
+            if entries:
+                similarities = np.stack([e["vector"] for e in entries]) @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    entry = entries[best]
+                    entry["last_used"] = time.time()
+                    self.hits += 1
+                    self.saved_seconds += entry["latency"]
+                    return entry["answer"]
+            self.misses += 1
+            return None
+
+    def store(self, key: str, query_vector, answer: str, latency: float, version=None):
+        """Caches an answer together with the latency it took to produce."""
+        now = time.time()
+        with self._lock:
+            entries = self._entries(key, version)
+            entries.append({
+                "vector": self._normalize(query_vector),
+                "answer": answer,
+                "latency": latency,
+                "created": now,
+                "last_used": now,
+            })
+            if len(entries) > self.max_entries:
+                entries.sort(key=lambda e: e["last_used"])
+                del entries[:len(entries) - self.max_entries]
+
+    def invalidate(self, key: str):
+        with self._lock:
+            self._projects.pop(key, None)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "saved_seconds": self.saved_seconds,
+                "entries": sum(len(p["entries"]) for p in self._projects.values()),
+            }
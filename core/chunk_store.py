@@ -0,0 +1,217 @@
+import json
+import os
+import sqlite3
+import threading
+from collections.abc import MutableMapping
+
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain.schema import Document
+
+CHUNK_DB_NAME = "chunks.sqlite"
+
+
+class _SQLiteFile:
+    """Shared connection to a project's chunk database. Only the path is pickled."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
+
+    def attach(self, path: str):
+        """Points the store at a (possibly relocated) database file."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self.path = path
+
+    def execute(self, sql: str, params=(), many: bool = False) -> list:
+        with self._lock:
+            if self._conn is None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("CREATE TABLE IF NOT EXISTS chunks (id TEXT PRIMARY KEY, text TEXT NOT NULL, metadata TEXT NOT NULL, chunk_hash TEXT)")
+                self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_hash ON chunks (chunk_hash)")
+                self._conn.execute("CREATE TABLE IF NOT EXISTS positions (position INTEGER PRIMARY KEY, doc_id TEXT NOT NULL)")
+                self._conn.execute("CREATE INDEX IF NOT EXISTS positions_doc_id ON positions (doc_id)")
+            with self._conn:
+                cursor = self._conn.executemany(sql, params) if many else self._conn.execute(sql, params)
+                return cursor.fetchall()
+
+
+class SQLiteDocstore(_SQLiteFile, Docstore, AddableMixin):
+    """Docstore that keeps chunk text and metadata on disk and fetches documents on demand.
+
+    Used in place of InMemoryDocstore so loading a project doesn't unpickle (or keep
+    resident) every chunk; FAISS only looks up the top-k hits of each query.
+    """
+
+    def add(self, texts: dict[str, Document]) -> None:
+        rows = [
+            (doc_id, doc.page_content, json.dumps(doc.metadata, default=str), doc.metadata.get("chunk_hash"))
+            for doc_id, doc in texts.items()
+        ]
+        self.execute("INSERT OR REPLACE INTO chunks (id, text, metadata, chunk_hash) VALUES (?, ?, ?, ?)", rows, many=True)
+
+    def search(self, search: str) -> Document | str:
+        rows = self.execute("SELECT text, metadata FROM chunks WHERE id = ?", (search,))
+        if not rows:
+            return f"ID {search} not found."
+        text, metadata = rows[0]
+        return Document(id=search, page_content=text, metadata=json.loads(metadata))
+
+    def delete(self, ids: list) -> None:
+        self.execute("DELETE FROM chunks WHERE id = ?", [(doc_id,) for doc_id in ids], many=True)
+
+    # Chunk rows are written before the index that maps them is saved, so a failed ingest can
+    # leave rows behind; only chunks mapped below the index's ntotal are part of the store.
+
+    def chunk_ids_by_hash(self, id_map: "SQLiteIdMap", ntotal: int) -> dict[str, str]:
+        """Returns {content hash: id} for the chunks mapped in id_map below position ntotal."""
+        return dict(self.execute(
+            f"SELECT c.chunk_hash, c.id FROM chunks c JOIN {id_map.table} p ON p.doc_id = c.id"
+            " WHERE p.position < ? AND c.chunk_hash IS NOT NULL",
+            (ntotal,),
+        ))
+
+    def delete_unmapped(self, id_map: "SQLiteIdMap", ntotal: int) -> int:
+        """Deletes chunk rows not mapped in id_map below position ntotal; returns how many.
+
+        Only call it under the project's write lock: another writer's rows are unmapped until it saves.
+        """
+        unmapped = f"id NOT IN (SELECT doc_id FROM {id_map.table} WHERE position < ?)"
+        count = self.execute(f"SELECT COUNT(*) FROM chunks WHERE {unmapped}", (ntotal,))[0][0]
+        if count:
+            self.execute(f"DELETE FROM chunks WHERE {unmapped}", (ntotal,))
+        return count
+
+    def iter_documents(self, id_map: "SQLiteIdMap", ntotal: int, batch_size: int = 500):
+        """Yields the chunks mapped in id_map below position ntotal without loading them all at once."""
+        last_id = ""
+        sql = (
+            f"SELECT c.id, c.text, c.metadata FROM chunks c JOIN {id_map.table} p ON p.doc_id = c.id"
+            " WHERE p.position < ? AND c.id > ? ORDER BY c.id LIMIT ?"
+        )
+        while rows := self.execute(sql, (ntotal, last_id, batch_size)):
+            for doc_id, text, metadata in rows:
+                yield Document(id=doc_id, page_content=text, metadata=json.loads(metadata))
+            last_id = rows[-1][0]
+
+    def iter_chunk_hashes(self, id_map: "SQLiteIdMap", ntotal: int, batch_size: int = 2000):
+        """Yields (id, chunk hash, metadata, text) for the chunks mapped in id_map below position ntotal.
+
+        The text is only read for rows stored without a hash (it is None otherwise).
+        """
+        last_id = ""
+        sql = (
+            f"SELECT c.id, c.chunk_hash, c.metadata, CASE WHEN c.chunk_hash IS NULL THEN c.text END"
+            f" FROM chunks c JOIN {id_map.table} p ON p.doc_id = c.id"
+            " WHERE p.position < ? AND c.id > ? ORDER BY c.id LIMIT ?"
+        )
+        while rows := self.execute(sql, (ntotal, last_id, batch_size)):
+            for doc_id, chunk_hash, metadata, text in rows:
+                yield doc_id, chunk_hash, json.loads(metadata), text
+            last_id = rows[-1][0]
+
+    def __len__(self) -> int:
+        return self.execute("SELECT COUNT(*) FROM chunks")[0][0]
+
+
+class SQLiteIdMap(_SQLiteFile, MutableMapping):
+    """On-disk replacement for FAISS's index_to_docstore_id dict (vector position -> docstore id).
+
+    Each saved index has its own positions table, which is never modified once saved:
+    writers work on a copy() and readers still holding the older index keep a map that
+    matches it. previous names the (table, ntotal) of the last saved map, so a load can
+    fall back to it if index.faiss was not replaced along with index.pkl.
+    """
+
+    def __init__(self, path: str, table: str = "positions", ntotal: int | None = None, previous: tuple | None = None):
+        super().__init__(path)
+        self.table = table
+        self.ntotal = ntotal  # Vectors in the index this map was saved with (None until saved)
+        self.previous = previous
+
+    def __getstate__(self):
+        return {"path": self.path, "table": self.table, "ntotal": self.ntotal, "previous": self.previous}
+
+    def __setstate__(self, state):
+        # Maps pickled before tables were versioned use the original "positions" table
+        self.__init__(state["path"], state.get("table", "positions"), state.get("ntotal"), state.get("previous"))
+
+    def __getitem__(self, position):
+        rows = self.execute(f"SELECT doc_id FROM {self.table} WHERE position = ?", (int(position),))
+        if not rows:
+            raise KeyError(position)
+        return rows[0][0]
+
+    def __setitem__(self, position, doc_id):
+        self.execute(f"INSERT OR REPLACE INTO {self.table} (position, doc_id) VALUES (?, ?)", (int(position), doc_id))
+
+    def __delitem__(self, position):
+        self.execute(f"DELETE FROM {self.table} WHERE position = ?", (int(position),))
+
+    def __iter__(self):
+        return iter([position for (position,) in self.execute(f"SELECT position FROM {self.table} ORDER BY position")])
+
+    def __len__(self) -> int:
+        return self.execute(f"SELECT COUNT(*) FROM {self.table}")[0][0]
+
+    def items(self):
+        return self.execute(f"SELECT position, doc_id FROM {self.table} ORDER BY position")
+
+    def values(self):
+        return [doc_id for _, doc_id in self.items()]
+
+    def positions_of(self, doc_ids: list[str]) -> dict[str, int]:
+        """Returns the position of each given docstore id that is mapped (a reverse lookup on the doc_id index)."""
+        doc_ids = list(doc_ids)
+        if not doc_ids:
+            return {}
+        placeholders = ", ".join("?" * len(doc_ids))
+        rows = self.execute(f"SELECT doc_id, position FROM {self.table} WHERE doc_id IN ({placeholders})", doc_ids)
+        return dict(rows)
+
+    def update(self, other=(), **kwargs):
+        rows = [(int(p), doc_id) for p, doc_id in dict(other, **kwargs).items()]
+        self.execute(f"INSERT OR REPLACE INTO {self.table} (position, doc_id) VALUES (?, ?)", rows, many=True)
+
+    def _generations(self) -> dict[int, str]:
+        rows = self.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'positions^_%' ESCAPE '^'")
+        return {int(name.rsplit("_", 1)[1]): name for (name,) in rows}
+
+    def copy(self, mapping: dict | None = None) -> "SQLiteIdMap":
+        """Returns a map on a new table holding mapping (default: this map's entries); this table is left as is."""
+        table = f"positions_{max(self._generations(), default=0) + 1}"
+        self.execute(f"CREATE TABLE {table} (position INTEGER PRIMARY KEY, doc_id TEXT NOT NULL)")
+        self.execute(f"CREATE INDEX {table}_doc_id ON {table} (doc_id)")
+        # An unsaved map (a writer's working copy) passes on the last saved one
+        previous = (self.table, self.ntotal) if self.ntotal is not None else self.previous
+        copied = SQLiteIdMap(self.path, table, previous=previous)
+        if mapping is None:
+            self.execute(f"INSERT INTO {table} (position, doc_id) SELECT position, doc_id FROM {self.table}")
+        else:
+            copied.update(mapping)
+        return copied
+
+    def drop_stale_tables(self):
+        """Drops every table but this map's and the previous saved one's (older maps and abandoned working copies).
+
+        Call it after saving, under the project's write lock, so no other writer has a working copy.
+        """
+        keep = {self.table, self.previous[0] if self.previous else None}
+        for name in self._generations().values():
+            if name not in keep:
+                self.execute(f"DROP TABLE {name}")
+
+    def truncate(self, length: int):
+        """Drops positions >= length (left behind if a save was interrupted after the map was written)."""
+        self.execute(f"DELETE FROM {self.table} WHERE position >= ?", (length,))
@@ -0,0 +1,105 @@
+import numpy as np
+from langchain.schema import Document
+
+
+def mmr_order(query_vector, vectors, lambda_mult: float = 0.7) -> list[int]:
+    """Orders candidates by maximal marginal relevance (cosine similarity).
+
+    Query and pairwise similarities are computed in one matrix product up front;
+    each step then only updates a running max-similarity vector.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    query = np.asarray(query_vector, dtype=np.float32)
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+    relevance = vectors @ query
+    pairwise = vectors @ vectors.T
+
+    order = []
+    max_similarity = np.full(len(vectors), -1.0, dtype=np.float32)
+    available = np.ones(len(vectors), dtype=bool)
+    for _ in range(len(vectors)):
+        scores = np.where(available, lambda_mult * relevance - (1 - lambda_mult) * max_similarity, -np.inf)
+        chosen = int(np.argmax(scores))
+        order.append(chosen)
+        available[chosen] = False
+        np.maximum(max_similarity, pairwise[chosen], out=max_similarity)
+    return order
+
+
+def _overlap(head: str, tail: str, min_overlap: int, max_overlap: int) -> int:
+    """Length of the longest suffix of head that is a prefix of tail (0 if shorter than min_overlap)."""
+    probe = tail[:min_overlap]
+    if len(probe) < min_overlap:
+        return 0
+    start = head.find(probe, max(0, len(head) - max_overlap))
+    while start != -1:
+        if tail.startswith(head[start:]):
+            return len(head) - start
+        start = head.find(probe, start + 1)
+    return 0
+
+
+def _merge_text(a: str, b: str, min_overlap: int, max_overlap: int) -> str | None:
+    """Joins two chunks that contain or overlap each other; None if they are unrelated."""
+    if b in a:
+        return a
+    if a in b:
+        return b
+    if n := _overlap(a, b, min_overlap, max_overlap):
+        return a + b[n:]
+    if n := _overlap(b, a, min_overlap, max_overlap):
+        return b + a[n:]
+    return None
+
+
+def merge_overlaps(docs: list[Document], min_overlap: int = 50, max_overlap: int = 1000) -> list[Document]:
+    """Merges chunks of the same page that share text (the splitter's chunk overlap) into one span.
+
+    A merged span takes the place of the highest-ranked chunk it contains.
+    """
+    merged = []
+    for doc in docs:
+        key = (doc.metadata.get("project"), doc.metadata.get("source"), doc.metadata.get("page"))
+        for i, kept in enumerate(merged):
+            if (kept.metadata.get("project"), kept.metadata.get("source"), kept.metadata.get("page")) != key:
+                continue
+            text = _merge_text(kept.page_content, doc.page_content, min_overlap, max_overlap)
+            if text is not None:
+                merged[i] = Document(page_content=text, metadata=kept.metadata)
+                break
+        else:
+            merged.append(doc)
+    return merged
+
+
+def pack_to_budget(docs: list[Document], max_tokens: int, count_tokens, overhead: int = 16,
+                   min_tail_tokens: int = 200) -> list[Document]:
+    """Keeps docs in rank order while they fit in max_tokens.
+
+    overhead accounts for the separators format_docs adds around each chunk. The first doc
+    that doesn't fit is truncated to the remaining budget (if at least min_tail_tokens are
+    left, or it would be the only doc) rather than dropped, and packing stops there.
+    """
+    packed, used = [], 0
+    for doc in docs:
+        tokens = count_tokens(doc.page_content)
+        if used + tokens + overhead <= max_tokens:
+            packed.append(doc)
+            used += tokens + overhead
+            continue
+        remaining = max_tokens - used - overhead
+        if remaining >= min_tail_tokens or not packed:
+            keep = int(len(doc.page_content) * max(remaining, 0) / (tokens or 1))
+            packed.append(Document(page_content=doc.page_content[:keep], metadata=doc.metadata))
+        break
+    return packed
+
+
+def assemble_context(query_vector, docs: list[Document], vectors, max_tokens: int, count_tokens,
+                     lambda_mult: float = 0.7) -> list[Document]:
+    """Re-ranks over-fetched candidates with MMR, merges overlapping spans and packs them to a token budget."""
+    if not docs:
+        return []
+    ranked = [docs[i] for i in mmr_order(query_vector, vectors, lambda_mult)]
+    return pack_to_budget(merge_overlaps(ranked), max_tokens, count_tokens)
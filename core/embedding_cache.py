@@ -0,0 +1,115 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from functools import lru_cache
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+def text_hash(text: str) -> str:
+    """Returns the content hash used to identify a chunk across projects."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Persistent on-disk embedding cache keyed by (deployment, chunk text hash).
+
+    Vectors are stored as raw float32 blobs in a single SQLite file so the cache
+    can be shared by every project under the data directory.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " deployment TEXT NOT NULL,"
+                " text_hash TEXT NOT NULL,"
+                " vector BLOB NOT NULL,"
+                " PRIMARY KEY (deployment, text_hash))"
+            )
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def get_many(self, deployment: str, hashes: list[str]) -> dict[str, list[float]]:
+        """Returns the cached vectors for the given hashes (misses are omitted)."""
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        with self._lock, self._connect() as conn:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE deployment = ? AND text_hash IN ({placeholders})",
+                    [deployment, *batch],
+                )
+                for h, blob in rows:
+                    found[h] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def put_many(self, deployment: str, items: dict[str, list[float]]):
+        """Stores vectors for the given hashes, overwriting existing entries."""
+        if not items:
+            return
+        rows = [(deployment, h, np.asarray(v, dtype=np.float32).tobytes()) for h, v in items.items()]
+        with self._lock, self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (deployment, text_hash, vector) VALUES (?, ?, ?)",
+                rows,
+            )
+
+
+def embed_with_cache(engine, cache: EmbeddingCache, deployment: str, texts: list[str]):
+    """Embeds texts, calling the embedding engine only for cache misses.
+
+    Each completed batch is written to the cache immediately, so an interrupted
+    ingest resumes from where it stopped. Returns (vectors, hits, misses) where
+    vectors is aligned with texts.
+    """
+    hashes = [text_hash(t) for t in texts]
+    cached = cache.get_many(deployment, hashes)
+
+    # Embed each distinct missing text once
+    missing = {}
+    for h, t in zip(hashes, texts):
+        if h not in cached and h not in missing:
+            missing[h] = t
+
+    if missing:
+        missing_hashes = list(missing.keys())
+
+        def checkpoint(indices, vectors):
+            fresh = {missing_hashes[i]: v for i, v in zip(indices, vectors)}
+            cache.put_many(deployment, fresh)
+            cached.update(fresh)
+
+        engine.embed(list(missing.values()), on_batch=checkpoint)
+
+    hits = sum(1 for h in hashes if h not in missing)
+    return [cached[h] for h in hashes], hits, len(hashes) - hits
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """Wraps an embeddings client with an in-memory LRU for query embeddings.
+
+    A question is embedded by the answer cache, the retriever and context assembly;
+    with this wrapper only the first of those calls reaches the service.
+    """
+
+    def __init__(self, embeddings, max_entries: int = 1024):
+        self.embeddings = embeddings
+        self._embed_query = lru_cache(maxsize=max_entries)(lambda text: tuple(embeddings.embed_query(text)))
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        return list(self._embed_query(text))
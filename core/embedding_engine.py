@@ -0,0 +1,148 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import tiktoken
+
+from .tracing import span
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+RETRYABLE_ERROR_NAMES = {"RateLimitError", "APITimeoutError", "APIConnectionError", "InternalServerError", "Timeout"}
+
+
+def _is_retryable(exc: Exception) -> bool:
+    status = getattr(exc, "status_code", None)
+    return status in RETRYABLE_STATUS_CODES or type(exc).__name__ in RETRYABLE_ERROR_NAMES
+
+
+def _retry_after(exc: Exception) -> float | None:
+    """Reads a Retry-After hint (in seconds) from an API error, if the server sent one."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after-ms") or headers.get("retry-after")
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        return None
+    return seconds / 1000 if "retry-after-ms" in headers else seconds
+
+
+class _AdaptiveLimiter:
+    """AIMD concurrency limit: halves on throttling, grows by one after a run of successes."""
+
+    def __init__(self, max_limit: int):
+        self.max_limit = max_limit
+        self.limit = max_limit
+        self.in_flight = 0
+        self._successes = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= self.limit:
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, throttled: bool):
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(1, self.limit // 2)
+                self._successes = 0
+            else:
+                self._successes += 1
+                if self.limit < self.max_limit and self._successes >= self.limit:
+                    self.limit += 1
+                    self._successes = 0
+            self._cond.notify_all()
+
+
+class EmbeddingEngine:
+    """Embeds texts in token-packed batches issued concurrently, backing off on throttling.
+
+    Batches are packed with tiktoken so each request stays under max_batch_tokens, and
+    on_batch is called as each batch completes so callers can checkpoint progress.
+    """
+
+    def __init__(self, embeddings, max_concurrency: int = 4, max_batch_tokens: int = 64000,
+                 max_batch_size: int = 256, max_retries: int = 8, encoding_name: str = "cl100k_base"):
+        self.embeddings = embeddings
+        self.max_concurrency = max_concurrency
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.max_retries = max_retries
+        try:
+            self.encoding = tiktoken.get_encoding(encoding_name)
+        except Exception as e:
+            # The encoding is downloaded on first use; fall back to an estimate when offline
+            print(f"Warning: tiktoken encoding '{encoding_name}' unavailable, estimating token counts. Error: {e}")
+            self.encoding = None
+        self.limiter = _AdaptiveLimiter(max_concurrency)
+
+    def count_tokens(self, text: str) -> int:
+        if self.encoding is None:
+            return len(text) // 4 + 1
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def pack_batches(self, texts: list[str]) -> list[list[int]]:
+        """Groups text indices into batches bounded by token count and batch size."""
+        batches, current, current_tokens = [], [], 0
+        for i, text in enumerate(texts):
+            tokens = self.count_tokens(text)
+            if current and (current_tokens + tokens > self.max_batch_tokens or len(current) >= self.max_batch_size):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(i)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def _embed_batch(self, batch: list[str]) -> list[list[float]]:
+        delay = 1.0
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            throttled = False
+            try:
+                with span("embed_request", texts=len(batch)):
+                    return self.embeddings.embed_documents(batch)
+            except Exception as e:
+                if not _is_retryable(e) or attempt == self.max_retries:
+                    raise
+                throttled = True
+                wait = _retry_after(e) or delay * (1 + random.random())
+                print(f"Embedding request throttled or timed out ({type(e).__name__}); retrying in {wait:.1f}s...")
+            finally:
+                self.limiter.release(throttled)
+            time.sleep(wait)
+            delay = min(delay * 2, 60.0)
+
+    def embed(self, texts: list[str], on_batch=None) -> list[list[float]]:
+        """Embeds texts and returns vectors aligned with the input order.
+
+        on_batch(indices, vectors) is invoked from the calling thread after each batch completes.
+        """
+        vectors = [None] * len(texts)
+        with span("embed_pack") as s:
+            batches = self.pack_batches(texts)
+            s.set(texts=len(texts), batches=len(batches))
+        with span("embed", texts=len(texts)), ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            futures = {pool.submit(self._embed_batch, [texts[i] for i in batch]): batch for batch in batches}
+            for future in as_completed(futures):
+                batch = futures[future]
+                try:
+                    batch_vectors = future.result()
+                except Exception:
+                    # Don't start queued batches once one has failed for good
+                    for pending in futures:
+                        pending.cancel()
+                    raise
+                for i, vector in zip(batch, batch_vectors):
+                    vectors[i] = vector
+                if on_batch:
+                    on_batch(batch, batch_vectors)
+        return vectors
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.embed(texts)
@@ -0,0 +1,130 @@
+import math
+
+import faiss
+import numpy as np
+
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_sq", "ivf_pq")
+LOSSY_INDEX_TYPES = {"ivf_sq", "ivf_pq"}
+MIN_PQ_NBITS = 4  # Fewer bits than this make codes too coarse to be worth training
+
+# Chunk counts at which auto-selection moves to the next index type
+AUTO_THRESHOLDS = (
+    (20_000, "flat"),       # brute force is exact and fast enough
+    (200_000, "hnsw"),      # graph search, full vectors kept in memory
+    (1_000_000, "ivf_sq"),  # 8-bit scalar quantization, ~4x smaller than float32
+)
+
+
+def choose_index_type(n_vectors: int) -> str:
+    """Picks an index type for a corpus of n_vectors chunks."""
+    for limit, index_type in AUTO_THRESHOLDS:
+        if n_vectors < limit:
+            return index_type
+    return "ivf_pq"
+
+
+def index_type_of(index) -> str:
+    """Returns the INDEX_TYPES name of a FAISS index."""
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVFScalarQuantizer):
+        return "ivf_sq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf_flat"
+    return "flat"
+
+
+def _nlist(n_vectors: int) -> int:
+    # ~4*sqrt(n) lists, but keep at least 39 training points per centroid as FAISS recommends
+    return max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // 39))
+
+
+def _pq_subquantizers(dim: int) -> int:
+    return max(m for m in range(1, 65) if dim % m == 0)
+
+
+def _pq_nbits(n_vectors: int) -> int:
+    # Each subquantizer trains 2**nbits centroids and needs at least that many points
+    return min(8, int(math.log2(max(n_vectors, 1))))
+
+
+def build_index(vectors: np.ndarray, index_type: str, train_size: int = 100_000, seed: int = 0):
+    """Builds and fills a FAISS index of the given type, training on a random sample if needed.
+
+    ivf_pq codes get fewer than 8 bits when there are under 256 vectors to train on, and
+    below 2**MIN_PQ_NBITS vectors the index falls back to ivf_sq.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}'. Expected one of {', '.join(INDEX_TYPES)}.")
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, dim = vectors.shape
+    if index_type == "ivf_pq" and _pq_nbits(n) < MIN_PQ_NBITS:
+        print(f"Too few vectors ({n}) to train PQ codes, building 'ivf_sq' instead.")
+        index_type = "ivf_sq"
+
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, 32)
+        index.hnsw.efConstruction = 80
+        index.hnsw.efSearch = 64
+    else:
+        nlist = _nlist(n)
+        description = {
+            "ivf_flat": f"IVF{nlist},Flat",
+            "ivf_sq": f"IVF{nlist},SQ8",
+            "ivf_pq": f"IVF{nlist},PQ{_pq_subquantizers(dim)}x{_pq_nbits(n)}",
+        }[index_type]
+        index = faiss.index_factory(dim, description)
+        sample = vectors
+        if n > train_size:
+            sample = vectors[np.random.default_rng(seed).choice(n, train_size, replace=False)]
+        index.train(sample)
+        index.nprobe = max(1, nlist // 16)
+
+    index.add(vectors)
+    return index
+
+
+def index_nbytes(index) -> int:
+    """Approximate resident size of an index: its vector codes, plus the HNSW graph or the IVF ids, centroids and codebook."""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        hnsw = index.hnsw
+        return index_nbytes(index.storage) + 4 * (hnsw.neighbors.size() + hnsw.levels.size()) + 8 * hnsw.offsets.size()
+    if isinstance(index, faiss.IndexIVF):
+        size = index.ntotal * (index.code_size + 8) + index_nbytes(index.quantizer)  # 8-byte id per listed vector
+        if isinstance(index, faiss.IndexIVFPQ):
+            size += index.pq.centroids.size() * 4
+        return size
+    return index.ntotal * getattr(index, "code_size", index.d * 4)
+
+
+def reconstruct_vectors(index) -> np.ndarray:
+    """Returns all vectors stored in an index (approximate for quantized indexes)."""
+    if isinstance(index, faiss.IndexIVF):
+        index.make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def recall_at_k(vectors: np.ndarray, index, k: int = 10, n_queries: int = 200, seed: int = 0) -> float:
+    """Measures recall@k of an index against exact brute-force search over the same vectors.
+
+    Queries are stored vectors sampled at random, perturbed slightly so they aren't exact matches.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, dim = vectors.shape
+    if n == 0:
+        return 1.0
+    k = min(k, n)
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.choice(n, min(n_queries, n), replace=False)]
+    queries = queries + rng.normal(0, 0.01, queries.shape).astype(np.float32)
+
+    baseline = faiss.IndexFlatL2(dim)
+    baseline.add(vectors)
+    _, expected = baseline.search(queries, k)
+    _, found = index.search(queries, k)
+    return float(np.mean([len(set(e) & set(f)) / k for e, f in zip(expected, found)]))
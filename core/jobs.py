@@ -0,0 +1,149 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from functools import partial
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+INGEST, DELETE = "ingest", "delete"
+
+
+class JobQueue:
+    """Persistent job queue for project writes (ingesting uploads, deleting documents), processed by background worker threads.
+
+    Jobs live in a SQLite file, so queued work survives restarts: jobs that were running
+    when the process stopped are put back in the queue when the workers start again.
+    Ingest jobs call handler(project_id, file_paths, on_progress) and delete jobs call
+    delete_handler(project_id, document_names); both return True on success. Writes to
+    the same project are serialized by the handlers themselves.
+    """
+
+    def __init__(self, path: str, num_workers: int = 2):
+        self.path = path
+        self.num_workers = num_workers
+        self._workers = []
+        self._wakeup = threading.Event()
+        self._start_lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY, project TEXT NOT NULL, files TEXT NOT NULL,"
+                " status TEXT NOT NULL, progress REAL NOT NULL DEFAULT 0, message TEXT NOT NULL DEFAULT '',"
+                " created REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "kind" not in columns:  # Queues created before delete jobs only held ingests
+                conn.execute(f"ALTER TABLE jobs ADD COLUMN kind TEXT NOT NULL DEFAULT '{INGEST}'")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def enqueue(self, project_id: str, file_paths: list[str], kind: str = INGEST) -> str:
+        """Adds a job and returns its id. For DELETE jobs, file_paths are the document names to remove."""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, project, files, kind, status, created, updated) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, project_id, json.dumps(file_paths), kind, QUEUED, now, now),
+            )
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id: str) -> dict | None:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list_jobs(self, project_id: str | None = None, limit: int = 20) -> list[dict]:
+        """Returns the most recent jobs, optionally for one project."""
+        query, params = "SELECT * FROM jobs", []
+        if project_id is not None:
+            query, params = query + " WHERE project = ?", [project_id]
+        with self._connect() as conn:
+            rows = conn.execute(query + " ORDER BY created DESC LIMIT ?", [*params, limit]).fetchall()
+        return [dict(row) for row in rows]
+
+    def _update(self, job_id: str, **fields):
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments}, updated = ? WHERE id = ?", [*fields.values(), time.time(), job_id])
+
+    def _claim_next(self) -> dict | None:
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT * FROM jobs WHERE status = ? ORDER BY created LIMIT 1", (QUEUED,)).fetchone()
+            if row:
+                conn.execute("UPDATE jobs SET status = ?, updated = ? WHERE id = ?", (RUNNING, time.time(), row["id"]))
+            conn.execute("COMMIT")
+            return dict(row) if row else None
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _run_job(self, job: dict, handler, delete_handler):
+        job_id = job["id"]
+        file_paths = json.loads(job["files"])
+
+        def on_progress(fraction: float, message: str):
+            self._update(job_id, progress=fraction, message=message)
+
+        if job["kind"] == DELETE:
+            run = partial(delete_handler, job["project"], file_paths)
+            done, error = f"Removed {', '.join(file_paths)}.", f"Could not remove {', '.join(file_paths)}. Check logs."
+        else:
+            run = partial(handler, job["project"], file_paths, on_progress)
+            done, error = f"Processed {len(file_paths)} file(s).", "Vector store update failed or no text could be extracted. Check logs."
+        try:
+            success = run()
+        except Exception as e:
+            traceback.print_exc()
+            success, error = False, str(e)
+
+        if success:
+            self._update(job_id, status=DONE, progress=1.0, message=done)
+        else:
+            self._update(job_id, status=FAILED, message=error)
+        if job["kind"] == DELETE:
+            return  # Its "files" are document names, not uploads to clean up
+        # Uploaded files are kept until their job finishes so an interrupted job can be resumed
+        for file_path in file_paths:
+            try:
+                os.remove(file_path)
+            except OSError as e:
+                print(f"Warning: could not remove uploaded file {file_path}. Error: {e}")
+        for upload_dir in {os.path.dirname(file_path) for file_path in file_paths}:
+            try:
+                os.rmdir(upload_dir)  # Per-upload folder, removed once empty
+            except OSError:
+                pass
+
+    def _worker_loop(self, handler, delete_handler):
+        while True:
+            job = self._claim_next()
+            if job is None:
+                self._wakeup.wait(timeout=5)
+                self._wakeup.clear()
+                continue
+            self._run_job(job, handler, delete_handler)
+
+    def start(self, handler, delete_handler=None):
+        """Starts the worker threads once per process, re-queueing jobs interrupted by a restart."""
+        with self._start_lock:
+            if self._workers:
+                return
+            with self._connect() as conn:
+                conn.execute("UPDATE jobs SET status = ?, message = ? WHERE status = ?", (QUEUED, "Resumed after restart.", RUNNING))
+            for i in range(self.num_workers):
+                worker = threading.Thread(target=self._worker_loop, args=(handler, delete_handler), name=f"ingest-worker-{i}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
@@ -0,0 +1,189 @@
+import os
+import re
+
+import numpy as np
+
+LEXICAL_INDEX_NAME = "bm25.npz"
+
+# Keeps identifiers such as "EBITDA-margin", "MSFT", "4.2.1" or "Q3_2024" together
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[._\-/][a-z0-9]+)*")
+SPLIT_RE = re.compile(r"[._\-/]")
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased tokens; compound identifiers are indexed whole and by their parts."""
+    tokens = []
+    for token in TOKEN_RE.findall(text.lower()):
+        tokens.append(token)
+        parts = SPLIT_RE.split(token)
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+class BM25Index:
+    """BM25 inverted index over a project's chunks, stored as flat NumPy posting arrays.
+
+    Postings are kept sorted by term (CSR layout), so scoring a query touches only the
+    posting slices of its terms and accumulates them with a single np.bincount. Postings
+    added since the last search, remove or save are buffered and merged in one pass.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.vocab: dict[str, int] = {}
+        self.doc_ids: list[str] = []
+        self.doc_len = np.zeros(0, dtype=np.float32)
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.post_docs = np.zeros(0, dtype=np.int32)
+        self.post_tfs = np.zeros(0, dtype=np.float32)
+        self._pending = ([], [], [], [])  # terms, docs, tfs and doc lengths not yet merged
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    @property
+    def nbytes(self) -> int:
+        self._merge_pending()
+        return self.post_docs.nbytes + self.post_tfs.nbytes + self.doc_len.nbytes + 64 * (len(self.vocab) + len(self.doc_ids))
+
+    def copy(self):
+        """Returns an independent copy (posting arrays are shared, since updates replace rather than mutate them)."""
+        self._merge_pending()
+        clone = BM25Index(self.k1, self.b)
+        clone.vocab = dict(self.vocab)
+        clone.doc_ids = list(self.doc_ids)
+        clone.doc_len, clone.indptr, clone.post_docs, clone.post_tfs = self.doc_len, self.indptr, self.post_docs, self.post_tfs
+        return clone
+
+    def _postings(self):
+        """Returns the posting lists as COO arrays (term, doc, tf)."""
+        terms = np.repeat(np.arange(len(self.indptr) - 1, dtype=np.int32), np.diff(self.indptr))
+        return terms, self.post_docs, self.post_tfs
+
+    def _set_postings(self, terms, docs, tfs):
+        """Replaces the postings with COO arrays already sorted by (term, doc)."""
+        self.post_docs = docs.astype(np.int32)
+        self.post_tfs = tfs.astype(np.float32)
+        counts = np.bincount(terms, minlength=len(self.vocab))
+        self.indptr = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+
+    def add(self, docs: dict[str, str]):
+        """Indexes {doc_id: text} pairs (merged into the posting arrays when next needed)."""
+        new_terms, new_docs, new_tfs, new_lens = self._pending
+        for doc_id, text in docs.items():
+            doc_index = len(self.doc_ids)
+            self.doc_ids.append(doc_id)
+            tokens = tokenize(text)
+            new_lens.append(len(tokens))
+            counts = {}
+            for token in tokens:
+                term = self.vocab.setdefault(token, len(self.vocab))
+                counts[term] = counts.get(term, 0) + 1
+            new_terms.extend(counts.keys())
+            new_docs.extend([doc_index] * len(counts))
+            new_tfs.extend(counts.values())
+
+    def _merge_pending(self):
+        """Merges buffered postings into the sorted arrays in time linear in their size.
+
+        Buffered documents come after every indexed one, so within each term their postings
+        go after the existing ones; only the buffered postings themselves need sorting.
+        """
+        new_terms, new_docs, new_tfs, new_lens = self._pending
+        if not new_lens:
+            return
+        self._pending = ([], [], [], [])
+        terms = np.asarray(new_terms, dtype=np.int64)
+        docs = np.asarray(new_docs, dtype=np.int32)
+        tfs = np.asarray(new_tfs, dtype=np.float32)
+        order = np.lexsort((docs, terms))
+        terms, docs, tfs = terms[order], docs[order], tfs[order]
+
+        old_counts = np.diff(self.indptr)
+        old_counts = np.concatenate((old_counts, np.zeros(len(self.vocab) - len(old_counts), dtype=np.int64)))
+        new_counts = np.bincount(terms, minlength=len(self.vocab))
+        indptr = np.concatenate(([0], np.cumsum(old_counts + new_counts))).astype(np.int64)
+        new_starts = np.concatenate(([0], np.cumsum(new_counts)))
+
+        old_terms = np.repeat(np.arange(len(self.indptr) - 1), np.diff(self.indptr))
+        old_dest = indptr[old_terms] + np.arange(len(self.post_docs)) - self.indptr[old_terms]
+        new_dest = indptr[terms] + old_counts[terms] + np.arange(len(terms)) - new_starts[terms]
+        # New arrays rather than in-place writes: copies of this index share the old ones
+        post_docs = np.empty(indptr[-1], dtype=np.int32)
+        post_tfs = np.empty(indptr[-1], dtype=np.float32)
+        post_docs[old_dest], post_tfs[old_dest] = self.post_docs, self.post_tfs
+        post_docs[new_dest], post_tfs[new_dest] = docs, tfs
+        self.post_docs, self.post_tfs, self.indptr = post_docs, post_tfs, indptr
+        self.doc_len = np.concatenate((self.doc_len, np.asarray(new_lens, dtype=np.float32)))
+
+    def remove(self, doc_ids):
+        """Drops documents from the index and renumbers the remaining ones."""
+        self._merge_pending()
+        removed = set(doc_ids)
+        keep = np.array([doc_id not in removed for doc_id in self.doc_ids], dtype=bool)
+        if keep.all():
+            return
+        new_index = np.cumsum(keep) - 1
+        terms, post_docs, tfs = self._postings()
+        mask = keep[post_docs]  # Renumbering keeps the order, so the kept postings stay sorted
+        self.doc_ids = [doc_id for doc_id, k in zip(self.doc_ids, keep) if k]
+        self.doc_len = self.doc_len[keep]
+        self._set_postings(terms[mask], new_index[post_docs[mask]], tfs[mask])
+
+    def search(self, query: str, k: int) -> list[tuple[str, float]]:
+        """Returns up to k (doc_id, score) pairs with the highest BM25 scores."""
+        self._merge_pending()
+        n_docs = len(self.doc_ids)
+        terms = {self.vocab[t] for t in tokenize(query) if t in self.vocab}
+        if not n_docs or not terms:
+            return []
+
+        avg_len = float(self.doc_len.mean()) or 1.0
+        slices = [slice(self.indptr[t], self.indptr[t + 1]) for t in terms]
+        docs = np.concatenate([self.post_docs[s] for s in slices])
+        tfs = np.concatenate([self.post_tfs[s] for s in slices])
+        df = np.array([s.stop - s.start for s in slices], dtype=np.float32)
+        idf = np.repeat(np.log(1 + (n_docs - df + 0.5) / (df + 0.5)), df.astype(np.int64))
+
+        norm = self.k1 * (1 - self.b + self.b * self.doc_len[docs] / avg_len)
+        scores = np.bincount(docs, weights=idf * tfs * (self.k1 + 1) / (tfs + norm), minlength=n_docs)
+
+        k = min(k, np.count_nonzero(scores))
+        if not k:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.doc_ids[i], float(scores[i])) for i in top]
+
+    def save(self, store_path: str):
+        self._merge_pending()
+        tmp_path = os.path.join(store_path, f"{LEXICAL_INDEX_NAME}.tmp.npz")
+        np.savez(
+            tmp_path,
+            terms=np.array(list(self.vocab), dtype=str),
+            doc_ids=np.array(self.doc_ids, dtype=str),
+            doc_len=self.doc_len,
+            indptr=self.indptr,
+            post_docs=self.post_docs,
+            post_tfs=self.post_tfs,
+            params=np.array([self.k1, self.b]),
+        )
+        os.replace(tmp_path, os.path.join(store_path, LEXICAL_INDEX_NAME))
+
+    @classmethod
+    def load(cls, store_path: str):
+        """Loads a project's BM25 index, or returns None if it has none."""
+        path = os.path.join(store_path, LEXICAL_INDEX_NAME)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            index = cls(*data["params"].tolist())
+            index.vocab = {term: i for i, term in enumerate(data["terms"].tolist())}
+            index.doc_ids = data["doc_ids"].tolist()
+            index.doc_len = data["doc_len"]
+            index.indptr = data["indptr"]
+            index.post_docs = data["post_docs"]
+            index.post_tfs = data["post_tfs"]
+        return index
@@ -0,0 +1,30 @@
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+
+@contextmanager
+def project_write_lock(store_path: str):
+    """Serializes writers to a project's store across threads and, where supported, processes."""
+    with _thread_locks_guard:
+        thread_lock = _thread_locks.setdefault(os.path.abspath(store_path), threading.Lock())
+
+    with thread_lock:
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(store_path, exist_ok=True)
+        with open(os.path.join(store_path, ".write.lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
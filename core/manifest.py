@@ -0,0 +1,54 @@
+import hashlib
+import json
+import os
+
+MANIFEST_NAME = "manifest.json"
+
+
+def file_hash(path: str, block_size: int = 1 << 20) -> str:
+    """sha256 of a file's bytes, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(block_size):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Manifest:
+    """Per-project record of which source document produced which chunks.
+
+    files maps a document name to {"hash": content hash, "chunk_ids": [docstore ids]}.
+    A chunk shared by several documents (same text) is listed under each of them and
+    is only removed from the index once no document references it.
+    """
+
+    def __init__(self, files: dict | None = None):
+        self.files = files or {}
+
+    @classmethod
+    def load(cls, store_path: str):
+        path = os.path.join(store_path, MANIFEST_NAME)
+        if not os.path.exists(path):
+            return cls()
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f)["files"])
+
+    def save(self, store_path: str):
+        path = os.path.join(store_path, MANIFEST_NAME)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"files": self.files}, f)
+        os.replace(tmp_path, path)
+
+    def plan(self, sources: dict[str, str], prune: bool = False) -> tuple[set[str], set[str]]:
+        """Diffs {name: content hash} against the manifest.
+
+        Returns (names to index, names to remove): new or changed documents are indexed,
+        unchanged ones are skipped, and with prune=True documents missing from sources are removed.
+        """
+        to_index = {name for name, digest in sources.items() if self.files.get(name, {}).get("hash") != digest}
+        to_remove = set(self.files) - set(sources) if prune else set()
+        return to_index, to_remove
+
+    def referenced_ids(self) -> set[str]:
+        return {chunk_id for entry in self.files.values() for chunk_id in entry["chunk_ids"]}
@@ -0,0 +1,93 @@
+"""Re-indexes existing projects in place with a different FAISS index type or docstore.
+
+Usage:
+    python -m core.migrate_index [PROJECT ...] [--index-type auto|flat|hnsw|ivf_flat|ivf_sq|ivf_pq] [--k 10]
+                                 [--docstore pickle|sqlite]
+
+Without project names every project under the data directory is migrated. The index
+type defaults to auto unless only --docstore is given. Recall@k against an exact flat
+index is reported for each re-indexed project so the speed/memory vs. accuracy
+trade-off is visible before relying on the new index.
+"""
+import argparse
+import os
+import time
+
+from .index_factory import INDEX_TYPES, choose_index_type, index_type_of, recall_at_k
+from .locks import project_write_lock
+from .rag import (
+    VECTOR_STORE_BASE_PATH,
+    answer_cache,
+    convert_docstore,
+    get_vector_store_path,
+    load_vector_store,
+    reindex_vector_store,
+    save_vector_store,
+    store_cache,
+    writable_copy,
+)
+
+
+def migrate_project(project_id: str, index_type: str | None, k: int, docstore: str | None = None) -> bool:
+    """Rebuilds one project's index and/or docstore and saves it. Returns False if the project has no index.
+
+    Runs under the project's write lock on a copy of the cached store, like an ingest, so
+    concurrent uploads wait for it and readers keep the old index until the new one is saved.
+    """
+    store_path = get_vector_store_path(project_id)
+    if not os.path.exists(os.path.join(store_path, "index.faiss")):
+        print(f"Skipping {project_id}: no index found at {store_path}")
+        return False
+    with project_write_lock(store_path):
+        return _migrate_locked(project_id, store_path, index_type, k, docstore)
+
+
+def _migrate_locked(project_id: str, store_path: str, index_type: str | None, k: int, docstore: str | None) -> bool:
+    vector_store = load_vector_store(store_path)
+    if vector_store is None:
+        print(f"Skipping {project_id}: no index found at {store_path}")
+        return False
+    vector_store = writable_copy(vector_store)
+
+    if docstore:
+        convert_docstore(vector_store, store_path, docstore)
+        print(f"{project_id}: chunks stored with the '{docstore}' docstore")
+
+    if index_type:
+        ntotal = vector_store.index.ntotal
+        target = choose_index_type(ntotal) if index_type == "auto" else index_type
+        current = index_type_of(vector_store.index)
+
+        start = time.perf_counter()
+        vectors = reindex_vector_store(vector_store, target)
+        build_seconds = time.perf_counter() - start
+        recall = recall_at_k(vectors, vector_store.index, k=k)
+        print(f"{project_id}: {ntotal} vectors, {current} -> {target}, built in {build_seconds:.1f}s, recall@{k} = {recall:.3f}")
+
+    save_vector_store(vector_store, store_path)
+    store_cache.put(store_path, vector_store)
+    answer_cache.invalidate(store_path)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-index existing projects with a different FAISS index type.")
+    parser.add_argument("projects", nargs="*", help="Projects to migrate (default: all projects in the data directory)")
+    parser.add_argument("--index-type", choices=("auto", *INDEX_TYPES))
+    parser.add_argument("--k", type=int, default=10, help="k used for the recall@k report")
+    parser.add_argument("--docstore", choices=("pickle", "sqlite"), help="Move chunk text to this docstore backend")
+    args = parser.parse_args()
+    index_type = args.index_type or (None if args.docstore else "auto")
+
+    projects = args.projects or sorted(
+        d for d in os.listdir(VECTOR_STORE_BASE_PATH) if os.path.isdir(os.path.join(VECTOR_STORE_BASE_PATH, d))
+    )
+    for project_id in projects:
+        try:
+            migrate_project(project_id, index_type, args.k, args.docstore)
+        except Exception as e:
+            print(f"Error migrating {project_id}: {e}")
+
+
+if __name__ == "__main__":
+    main()
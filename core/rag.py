@@ -1,106 +1,613 @@
+import copy
 import os
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+from typing import Callable, Iterable, Iterator, NamedTuple
+import faiss
+import numpy as np
 from langchain_community.vectorstores import FAISS
-from langchain_community.document_loaders import PyPDFLoader, TextLoader
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_openai import AzureOpenAIEmbeddings, AzureChatOpenAI
 from langchain_core.prompts import PromptTemplate
-from langchain.chains.llm import LLMChain
 from langchain.schema import Document
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
 
 from .utils import load_config
+from . import tracing
+from .tracing import span
+from .embedding_cache import CachedQueryEmbeddings, EmbeddingCache, embed_with_cache, text_hash
+from .embedding_engine import EmbeddingEngine
+from .store_cache import StoreCache, index_signature
+from .answer_cache import AnswerCache
+from .context import assemble_context
+from .chunk_store import CHUNK_DB_NAME, SQLiteDocstore, SQLiteIdMap
+from .lexical_index import BM25Index
+from .manifest import Manifest, file_hash
+from .locks import project_write_lock
+from .retrievers import FederatedRetriever, HybridRetriever, shard_pool
+from .index_factory import LOSSY_INDEX_TYPES, build_index, choose_index_type, index_type_of, reconstruct_vectors
 
 VECTOR_STORE_BASE_PATH = "data"
+EMBEDDING_CACHE_NAME = ".embedding_cache.sqlite"
 config = load_config() # Load config once
 
-# --- Initialize Embeddings ---
-try:
-    if not config.get("azure_embedding_deployment"):
-        raise ValueError("AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME not set.")
-    embeddings = AzureOpenAIEmbeddings(
-        azure_deployment=config["azure_embedding_deployment"],
-        openai_api_version=config["azure_api_version"],
-        azure_endpoint=config["azure_endpoint"],
-        openai_api_key=config["azure_api_key"],
+# --- Per-stage tracing (no-op unless RAG_TRACING is set) ---
+tracing.configure(
+    config["tracing"],
+    log_path=config["trace_log"],
+    metrics_path=config["metrics_path"],
+    metrics_port=config["metrics_port"],
+    metrics_host=config["metrics_host"],
+)
+
+# --- Embeddings client and batch engine, built on first use by get_embeddings() ---
+embeddings = None
+embedding_engine = None  # Concurrent, throttling-aware batch embedding used during ingestion
+_embeddings_initialized = False
+_embeddings_lock = threading.Lock()
+
+# --- Shared embedding cache (one file for all projects, keyed by deployment + chunk hash), opened by get_embedding_cache() ---
+embedding_cache = None
+_embedding_cache_initialized = False
+_embedding_cache_lock = threading.Lock()
+
+# --- Process-wide cache of loaded FAISS stores (shared by all Streamlit sessions) ---
+store_cache = StoreCache(config["store_cache_mb"] * 1024 * 1024)
+
+# --- Semantic cache of answers per project, invalidated when the project's index changes ---
+answer_cache = AnswerCache(
+    threshold=config["answer_cache_threshold"],
+    ttl_seconds=config["answer_cache_ttl"],
+    max_entries=config["answer_cache_size"],
+)
+
+def get_embeddings():
+    """Returns the shared embeddings client, creating the Azure client on first use (None if unavailable).
+
+    langchain_openai (and the openai SDK) is imported here rather than at module import,
+    which keeps it off the start-up path of processes that never embed.
+    """
+    global _embeddings_initialized
+    if _embeddings_initialized:
+        return embeddings
+    with _embeddings_lock:
+        if not _embeddings_initialized:
+            try:
+                if not config.get("azure_embedding_deployment"):
+                    raise ValueError("AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME not set.")
+                from langchain_openai import AzureOpenAIEmbeddings
+                set_embeddings(AzureOpenAIEmbeddings(
+                    azure_deployment=config["azure_embedding_deployment"],
+                    openai_api_version=config["azure_api_version"],
+                    azure_endpoint=config["azure_endpoint"],
+                    openai_api_key=config["azure_api_key"],
+                ))
+            except Exception as e:
+                print(f"Error initializing Azure Embeddings: {e}")
+            _embeddings_initialized = True
+    return embeddings
+
+def set_embeddings(new_embeddings, deployment: str | None = None):
+    """Replaces the embeddings client, e.g. with a local stand-in for benchmarks or offline runs.
+
+    deployment names the model in the embedding cache key; pass a distinct name for stand-ins.
+    """
+    global embeddings, embedding_engine, _embeddings_initialized
+    client = CachedQueryEmbeddings(new_embeddings)
+    engine = EmbeddingEngine(
+        client,
+        max_concurrency=config["embed_concurrency"],
+        max_batch_tokens=config["embed_batch_tokens"],
     )
-except Exception as e:
-    print(f"Error initializing Azure Embeddings: {e}")
-    embeddings = None # Handle potential init failure
+    if deployment:
+        config["azure_embedding_deployment"] = deployment
+    embeddings, embedding_engine = client, engine
+    # Set last: get_embeddings reads the flag without the lock and must never see it before both are assigned
+    _embeddings_initialized = True
+
+def get_embedding_cache() -> EmbeddingCache | None:
+    """Returns the shared embedding cache, opening it on first use (None if unavailable).
+
+    Opened here rather than at module import, so importing this module creates no files.
+    """
+    global embedding_cache, _embedding_cache_initialized
+    if _embedding_cache_initialized:
+        return embedding_cache
+    with _embedding_cache_lock:
+        if not _embedding_cache_initialized:
+            try:
+                embedding_cache = EmbeddingCache(os.path.join(VECTOR_STORE_BASE_PATH, EMBEDDING_CACHE_NAME))
+            except Exception as e:
+                print(f"Warning: Embedding cache unavailable, every chunk will be embedded. Error: {e}")
+            _embedding_cache_initialized = True
+    return embedding_cache
+
+def set_embedding_cache(cache: EmbeddingCache | None):
+    """Replaces the embedding cache (None turns caching off), e.g. with a fresh file for benchmarks."""
+    global embedding_cache, _embedding_cache_initialized
+    embedding_cache, _embedding_cache_initialized = cache, True
 
 def get_vector_store_path(project_id: str) -> str:
     """Gets the path for a project's vector store."""
     project_id_safe = "".join(c if c.isalnum() else "_" for c in project_id) # Basic sanitization
     return os.path.join(VECTOR_STORE_BASE_PATH, project_id_safe)
 
+def _load_from_disk(store_path: str):
+    with span("index_load") as s:
+        # Be mindful of allow_dangerous_deserialization=True risk if index source is untrusted
+        vector_store = FAISS.load_local(store_path, get_embeddings(), allow_dangerous_deserialization=True)
+        s.set(vectors=vector_store.index.ntotal)
+    if isinstance(vector_store.docstore, SQLiteDocstore):
+        # Only the database path was pickled; bind it to this store's directory
+        db_path = os.path.join(store_path, CHUNK_DB_NAME)
+        vector_store.docstore.attach(db_path)
+        id_map = vector_store.index_to_docstore_id
+        id_map.attach(db_path)
+        ntotal = vector_store.index.ntotal
+        if id_map.ntotal is None:
+            id_map.truncate(ntotal)  # Unversioned map of an older store
+        elif id_map.ntotal != ntotal and id_map.previous and id_map.previous[1] == ntotal:
+            # A save was interrupted after index.pkl was replaced but before index.faiss was
+            print(f"Warning: index.faiss at {store_path} predates index.pkl; using the id map saved with it.")
+            vector_store.index_to_docstore_id = SQLiteIdMap(db_path, *id_map.previous)
+    vector_store.lexical_index = BM25Index.load(store_path)
+    return vector_store
+
+def load_vector_store(store_path: str):
+    """Returns the FAISS store at store_path from the process-wide cache, loading it if stale or missing."""
+    return store_cache.get(store_path, lambda: _load_from_disk(store_path))
+
+def _new_vector_store(store_path: str, text_embeddings: list, metadatas: list[dict], ids: list[str]):
+    """Creates a FAISS store using the configured docstore backend."""
+    if config["docstore"] != "sqlite":
+        return FAISS.from_embeddings(text_embeddings, embeddings, metadatas=metadatas, ids=ids)
+
+    db_path = os.path.join(store_path, CHUNK_DB_NAME)
+    # A fresh table, so a leftover database from a deleted index can't shift positions
+    id_map = SQLiteIdMap(db_path).copy({})
+    docstore = SQLiteDocstore(db_path)
+    docstore.delete_unmapped(id_map, 0)  # Rows of a failed first ingest or a deleted index
+    vector_store = FAISS(embeddings, faiss.IndexFlatL2(len(text_embeddings[0][1])), docstore, id_map)
+    texts, vectors = zip(*text_embeddings)
+    _add_vectors(vector_store, texts, vectors, metadatas, ids)
+    return vector_store
+
+def _add_vectors(vector_store, texts, vectors, metadatas: list[dict], ids: list[str]):
+    """Appends chunks to a store at positions index.ntotal onwards.
+
+    Used instead of FAISS.add_embeddings, which numbers new positions from
+    len(index_to_docstore_id) and so overwrites live entries once tombstones are unmapped.
+    """
+    vectors = np.array(vectors, dtype=np.float32)
+    if vector_store._normalize_L2:
+        faiss.normalize_L2(vectors)
+    start = vector_store.index.ntotal
+    vector_store.index.add(vectors)
+    vector_store.docstore.add({doc_id: Document(id=doc_id, page_content=text, metadata=metadata)
+                               for doc_id, text, metadata in zip(ids, texts, metadatas)})
+    vector_store.index_to_docstore_id.update({start + j: doc_id for j, doc_id in enumerate(ids)})
+
+def save_vector_store(vector_store, store_path: str):
+    """Writes a store's index.faiss and index.pkl, replacing the previous pair only once both are written.
+
+    index.pkl is swapped in first and index.faiss (whose signature readers check) last.
+    If the process dies between the two, a SQLite-backed store still loads consistently:
+    the new id map records its predecessor, which matches the old index.faiss.
+    """
+    id_map = vector_store.index_to_docstore_id
+    if isinstance(id_map, SQLiteIdMap):
+        id_map.ntotal = vector_store.index.ntotal
+    vector_store.save_local(store_path, index_name="index.tmp")
+    os.replace(os.path.join(store_path, "index.tmp.pkl"), os.path.join(store_path, "index.pkl"))
+    os.replace(os.path.join(store_path, "index.tmp.faiss"), os.path.join(store_path, "index.faiss"))
+    if isinstance(id_map, SQLiteIdMap):
+        id_map.drop_stale_tables()
+
+def iter_store_documents(vector_store) -> Iterator[tuple[str, Document]]:
+    """Yields (docstore id, document) for every chunk in a store."""
+    if isinstance(vector_store.docstore, SQLiteDocstore):
+        for doc in vector_store.docstore.iter_documents(vector_store.index_to_docstore_id, vector_store.index.ntotal):
+            yield doc.id, doc
+    else:
+        yield from vector_store.docstore._dict.items()
+
+def _lexical_index_for(vector_store) -> BM25Index:
+    """Returns a store's BM25 index, building it from the stored chunks if the store predates it."""
+    lexical_index = getattr(vector_store, "lexical_index", None) if vector_store else None
+    if lexical_index is None:
+        lexical_index = BM25Index()
+        if vector_store:
+            print("Building BM25 index for existing chunks...")
+            lexical_index.add({doc_id: doc.page_content for doc_id, doc in iter_store_documents(vector_store)})
+    return lexical_index
+
+def convert_docstore(vector_store, store_path: str, backend: str):
+    """Moves a store's chunks to the given docstore backend ("pickle" or "sqlite") in place."""
+    if backend == "sqlite" and not isinstance(vector_store.docstore, SQLiteDocstore):
+        db_path = os.path.join(store_path, CHUNK_DB_NAME)
+        docstore = SQLiteDocstore(db_path)
+        docstore.add(dict(vector_store.docstore._dict))
+        id_map = SQLiteIdMap(db_path).copy(dict(vector_store.index_to_docstore_id))
+        vector_store.docstore, vector_store.index_to_docstore_id = docstore, id_map
+    elif backend == "pickle" and isinstance(vector_store.docstore, SQLiteDocstore):
+        docs = vector_store.docstore.iter_documents(vector_store.index_to_docstore_id, vector_store.index.ntotal)
+        vector_store.docstore = InMemoryDocstore({doc.id: doc for doc in docs})
+        vector_store.index_to_docstore_id = dict(vector_store.index_to_docstore_id.items())
+
+def _load_file(file_path: str) -> tuple[list[Document], float]:
+    """Parses a single PDF or TXT file into page documents (runs inside a worker process).
+
+    Returns the pages and the seconds spent parsing, so the parent process can trace it.
+    """
+    start = time.perf_counter()
+    return _parse_file(file_path), time.perf_counter() - start
+
+def _parse_file(file_path: str) -> list[Document]:
+    # Imported in the loader worker: the loaders pull in PDF and image parsing libraries
+    from langchain_community.document_loaders import PyPDFLoader, TextLoader
+    try:
+        if file_path.lower().endswith(".pdf"):
+            docs = PyPDFLoader(file_path).load()
+        elif file_path.lower().endswith(".txt"):
+            docs = TextLoader(file_path, encoding='utf-8').load()
+        else:
+            return []
+        print(f"Successfully loaded {os.path.basename(file_path)}")
+        return docs
+    except Exception as e:
+        print(f"Warning: Could not load file {os.path.basename(file_path)}. Error: {e}")
+        return []
+
+def iter_documents(file_paths: list[str], max_workers: int | None = None, on_file=None) -> Iterator[Document]:
+    """Parses files in a process pool and yields their pages in input order as each file completes.
+
+    on_file() is called after each file has been parsed.
+    """
+    max_workers = max_workers or config["loader_workers"]
+    if max_workers <= 1 or len(file_paths) <= 1:
+        for file_path in file_paths:
+            docs, seconds = _load_file(file_path)
+            tracing.record("load_file", seconds, pages=len(docs))
+            if on_file:
+                on_file()
+            yield from docs
+        return
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        # Keep only a bounded number of parsed files in flight so memory doesn't grow with the corpus
+        pending = deque()
+        paths = iter(file_paths)
+        for file_path in islice(paths, max_workers * 2):
+            pending.append(pool.submit(_load_file, file_path))
+        while pending:
+            docs, seconds = pending.popleft().result()
+            tracing.record("load_file", seconds, pages=len(docs))
+            next_path = next(paths, None)
+            if next_path is not None:
+                pending.append(pool.submit(_load_file, next_path))
+            if on_file:
+                on_file()
+            yield from docs
+
 def load_documents(file_paths: list[str]) -> list[Document]:
     """Loads documents from PDF and TXT files."""
-    docs = []
-    for file_path in file_paths:
-        try:
-            if file_path.lower().endswith(".pdf"):
-                loader = PyPDFLoader(file_path)
-                docs.extend(loader.load())
-            elif file_path.lower().endswith(".txt"):
-                loader = TextLoader(file_path, encoding='utf-8')
-                docs.extend(loader.load())
-            print(f"Successfully loaded {os.path.basename(file_path)}")
-        except Exception as e:
-            print(f"Warning: Could not load file {os.path.basename(file_path)}. Error: {e}")
-    return docs
+    return list(iter_documents(file_paths))
 
-def chunk_documents(docs: list[Document]) -> list[Document]:
-    """Splits documents into smaller chunks."""
-    text_splitter = RecursiveCharacterTextSplitter(
+def _text_splitter() -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(
         chunk_size=5000,
         chunk_overlap=300,
         length_function=len
     )
-    return text_splitter.split_documents(docs)
 
-def create_or_update_vector_store(project_id: str, docs: list[Document]):
-    """Creates a new vector store or updates an existing one for a project using FAISS."""
-    if not embeddings:
+def iter_chunks(docs: Iterable[Document]) -> Iterator[Document]:
+    """Splits documents into chunks one page at a time."""
+    text_splitter = _text_splitter()
+    for doc in docs:
+        with span("chunk") as s:
+            chunks = text_splitter.split_documents([doc])
+            s.set(chunks=len(chunks), chars=len(doc.page_content))
+        yield from chunks
+
+def chunk_documents(docs: list[Document]) -> list[Document]:
+    """Splits documents into smaller chunks."""
+    return list(iter_chunks(docs))
+
+def iter_batches(items: Iterable, batch_size: int) -> Iterator[list]:
+    """Groups an iterable into lists of at most batch_size items."""
+    items = iter(items)
+    while batch := list(islice(items, batch_size)):
+        yield batch
+
+def ingest_files(project_id: str, file_paths: list[str], on_progress=None, names: list[str] | None = None, prune: bool = False):
+    """Streams files through parsing, chunking and embedding into a project's vector store.
+
+    Files are tracked in the project's manifest under names (default: their file names).
+    A file whose content is unchanged since it was last ingested is skipped; a changed
+    one replaces its previous chunks. With prune=True, documents that are not among
+    names are deleted, so the given files become the project's whole corpus.
+    on_progress(fraction, message) is called as files are parsed and chunks are indexed.
+    """
+    if not get_embeddings():
         print("Error: Embeddings not initialized. Cannot create/update vector store.")
         return False
-        
+    names = names or [os.path.basename(path) for path in file_paths]
+    hashes = {name: file_hash(path) for name, path in zip(names, file_paths)}
     store_path = get_vector_store_path(project_id)
     os.makedirs(store_path, exist_ok=True)
 
-    if not docs:
-        print(f"No processable documents provided for project {project_id}.")
+    with project_write_lock(store_path):
+        to_index, to_remove = Manifest.load(store_path).plan(hashes, prune=prune)
+        sources = {path: (name, hashes[name]) for name, path in zip(names, file_paths) if name in to_index}
+        skipped = len(file_paths) - len(sources)
+        if skipped:
+            print(f"Skipping {skipped} unchanged file(s) for project {project_id}.")
+        if not sources and not to_remove:
+            return True
+        files_done = 0
+
+        def file_parsed():
+            nonlocal files_done
+            files_done += 1
+
+        def chunks_indexed(added: int):
+            if on_progress:
+                on_progress(0.95 * files_done / max(len(sources), 1), f"Parsed {files_done}/{len(sources)} changed file(s), indexed {added} new chunk(s)")
+
+        docs = iter_documents(list(sources), on_file=file_parsed)
+        return _update_vector_store(project_id, store_path, docs, config["ingest_batch_size"], chunks_indexed, sources=sources, removed=to_remove)
+
+def delete_documents(project_id: str, names: list[str]):
+    """Removes documents (by manifest name) and the chunks only they referenced from a project."""
+    store_path = get_vector_store_path(project_id)
+    if not os.path.exists(os.path.join(store_path, "index.faiss")):
         return False
+    with project_write_lock(store_path):
+        return _update_vector_store(project_id, store_path, [], config["ingest_batch_size"], None, sources={}, removed=set(names))
+
+def list_documents(project_id: str) -> dict[str, int]:
+    """Returns {document name: chunk count} for the documents tracked in a project's manifest."""
+    manifest = Manifest.load(get_vector_store_path(project_id))
+    return {name: len(entry["chunk_ids"]) for name, entry in sorted(manifest.files.items())}
+
+def create_or_update_vector_store(project_id: str, docs: Iterable[Document], batch_size: int | None = None, on_progress=None):
+    """Creates a new vector store or updates an existing one for a project using FAISS.
 
-    chunked_docs = chunk_documents(docs)
-    if not chunked_docs:
-        print(f"No text could be extracted or chunked for project {project_id}.")
+    docs may be a list or a lazy iterator; chunks are embedded and indexed in batches
+    of batch_size so peak memory depends on the batch size rather than the corpus size.
+    on_progress(added) is called after each batch with the number of chunks indexed so far.
+    """
+    if not get_embeddings():
+        print("Error: Embeddings not initialized. Cannot create/update vector store.")
         return False
 
-    print(f"Processing {len(chunked_docs)} chunks for project {project_id}...")
+    store_path = get_vector_store_path(project_id)
+    os.makedirs(store_path, exist_ok=True)
+    batch_size = batch_size or config["ingest_batch_size"]
+
+    # Writers to the same project are serialized so concurrent uploads can't drop each other's chunks
+    with project_write_lock(store_path):
+        return _update_vector_store(project_id, store_path, docs, batch_size, on_progress)
+
+def writable_copy(vector_store):
+    """Copy-on-write clone of a cached store, so queries on the cached copy never race with an ingest.
+
+    A SQLite-backed clone shares the chunk rows (readers skip ids they can't find) but gets its
+    own id map table, since positions are renumbered and unmapped as chunks are deleted.
+    """
+    clone = copy.copy(vector_store)
+    clone.index = faiss.clone_index(vector_store.index)
+    if isinstance(vector_store.docstore, SQLiteDocstore):
+        clone.index_to_docstore_id = vector_store.index_to_docstore_id.copy()
+    else:
+        clone.docstore = InMemoryDocstore(dict(vector_store.docstore._dict))
+        clone.index_to_docstore_id = dict(vector_store.index_to_docstore_id)
+    if getattr(vector_store, "lexical_index", None) is not None:
+        clone.lexical_index = vector_store.lexical_index.copy()
+    return clone
 
+def _update_vector_store(project_id: str, store_path: str, docs: Iterable[Document], batch_size: int, on_progress,
+                         sources: dict | None = None, removed: set[str] = frozenset()):
+    """Adds docs to a project's store and applies manifest changes.
+
+    sources maps each parsed file path to (document name, content hash); those documents'
+    manifest entries are replaced by the chunks produced now, and documents in removed
+    are dropped. Chunks no longer referenced by any document are then deleted.
+    """
     try:
         # --- FAISS Implementation ---
+        vector_store = None
         if os.path.exists(os.path.join(store_path, "index.faiss")):
             print("Loading existing FAISS index...")
-            # Be mindful of allow_dangerous_deserialization=True risk if index source is untrusted
-            vector_store = FAISS.load_local(store_path, embeddings, allow_dangerous_deserialization=True)
-            print(f"Adding {len(chunked_docs)} new chunks to existing index...")
-            vector_store.add_documents(chunked_docs)
-        else:
-            print("Creating new FAISS index...")
-            vector_store = FAISS.from_documents(chunked_docs, embeddings)
+            vector_store = writable_copy(load_vector_store(store_path))
+            if isinstance(vector_store.docstore, SQLiteDocstore):
+                # Chunk rows written by an ingest that failed before saving its index
+                stale = vector_store.docstore.delete_unmapped(vector_store.index_to_docstore_id, vector_store.index.ntotal)
+                if stale:
+                    print(f"Removed {stale} chunk row(s) left behind by an interrupted ingest.")
+
+        # Reuse chunks that are already in this project's index (or repeated within the upload)
+        known = _indexed_chunk_ids(vector_store) if vector_store else {}
+        lexical_index = _lexical_index_for(vector_store)
+        manifest = Manifest.load(store_path)
+        document_chunks = {name: [] for name, _ in (sources or {}).values()}
+        total = added = hits = misses = 0
+
+        for batch in iter_batches(iter_chunks(docs), batch_size):
+            total += len(batch)
+            new_docs, ids = [], []
+            for doc in batch:
+                doc.metadata["chunk_hash"] = text_hash(doc.page_content)
+                chunk_id = known.get(doc.metadata["chunk_hash"])
+                if chunk_id is None:
+                    chunk_id = known[doc.metadata["chunk_hash"]] = str(uuid.uuid4())
+                    new_docs.append(doc)
+                    ids.append(chunk_id)
+                if sources and doc.metadata.get("source") in sources:
+                    document_chunks[sources[doc.metadata["source"]][0]].append(chunk_id)
+            if not new_docs:
+                continue
+
+            texts = [doc.page_content for doc in new_docs]
+            metadatas = [doc.metadata for doc in new_docs]
+            cache = get_embedding_cache()
+            if cache:
+                vectors, batch_hits, batch_misses = embed_with_cache(embedding_engine, cache, config["azure_embedding_deployment"], texts)
+            else:
+                vectors, batch_hits, batch_misses = embedding_engine.embed(texts), 0, len(texts)
+            hits += batch_hits
+            misses += batch_misses
+
+            if vector_store:
+                _add_vectors(vector_store, texts, vectors, metadatas, ids)
+            else:
+                print("Creating new FAISS index...")
+                vector_store = _new_vector_store(store_path, list(zip(texts, vectors)), metadatas, ids)
+            lexical_index.add(dict(zip(ids, texts)))
+            added += len(new_docs)
+            print(f"Indexed {added} new chunks so far for project {project_id}...")
+            if on_progress:
+                on_progress(added)
 
-        vector_store.save_local(store_path)
+        if not total and not removed:
+            print(f"No text could be extracted or chunked for project {project_id}.")
+            return False
+
+        # --- Manifest diff: replaced and removed documents release their old chunks ---
+        released = set()
+        for name in [*removed, *document_chunks]:
+            entry = manifest.files.pop(name, None)
+            if entry:
+                released.update(entry["chunk_ids"])
+        for name, digest in (sources or {}).values():
+            manifest.files[name] = {"hash": digest, "chunk_ids": list(dict.fromkeys(document_chunks[name]))}
+        orphans = released - manifest.referenced_ids()
+        deleted = 0
+        if orphans and vector_store:
+            deleted = delete_chunks(vector_store, orphans)
+            lexical_index.remove(orphans)
+
+        if total:
+            print(f"Embedding cache: {hits} hits, {misses} misses ({total - added} of {total} chunks already indexed).")
+        if not added and not deleted:
+            if sources is not None:
+                manifest.save(store_path)
+            print(f"All chunks are already indexed for project {project_id}. Nothing to do.")
+            return True
+        if deleted:
+            print(f"Deleted {deleted} chunk(s) no longer referenced by any document in project {project_id}.")
+
+        apply_index_policy(vector_store)
+        # Written before index.faiss so the index file's signature covers both
+        with span("index_save", vectors=vector_store.index.ntotal):
+            lexical_index.save(store_path)
+            vector_store.lexical_index = lexical_index
+            save_vector_store(vector_store, store_path)
+        # Written last: if a save is interrupted, re-ingesting the file finds its chunks by hash and recovers
+        if sources is not None:
+            manifest.save(store_path)
+        # Keep the updated store cached under its new file signature instead of reloading from disk
+        store_cache.put(store_path, vector_store)
+        answer_cache.invalidate(store_path)
         print(f"Vector store updated and saved for project {project_id} at {store_path}")
         return True
     except Exception as e:
+        # The cached store may have been partially mutated; force a clean reload next time
+        store_cache.invalidate(store_path)
         print(f"Error during vector store creation/update for {project_id}: {e}")
         return False
 
+def _indexed_chunk_ids(vector_store) -> dict[str, str]:
+    """Returns {content hash: docstore id} for every chunk already stored in a FAISS index."""
+    if isinstance(vector_store.docstore, SQLiteDocstore):
+        return vector_store.docstore.chunk_ids_by_hash(vector_store.index_to_docstore_id, vector_store.index.ntotal)
+    ids = {}
+    for doc_id, doc in vector_store.docstore._dict.items():
+        # Older indexes were built before chunk hashes were recorded in metadata
+        ids[doc.metadata.get("chunk_hash") or text_hash(doc.page_content)] = doc_id
+    return ids
+
+def _replace_id_map(vector_store, mapping: dict):
+    if isinstance(vector_store.index_to_docstore_id, SQLiteIdMap):
+        # Written to a new table: the current one may be the map of a saved index that readers hold
+        vector_store.index_to_docstore_id = vector_store.index_to_docstore_id.copy(mapping)
+    else:
+        vector_store.index_to_docstore_id = mapping
+
+def delete_chunks(vector_store, ids: set[str]) -> int:
+    """Deletes chunks from a store and returns how many were found.
+
+    Flat indexes drop the vectors and renumber the positions after them. Graph and IVF
+    indexes can't do that, so there the positions become tombstones, unmapped in
+    index_to_docstore_id, that searches skip until apply_index_policy compacts the index.
+    Call it on a writable_copy: cached readers must keep the id map of their index.
+    """
+    positions = {position: doc_id for position, doc_id in vector_store.index_to_docstore_id.items() if doc_id in ids}
+    if not positions:
+        return 0
+    vector_store.docstore.delete(list(positions.values()))
+    if index_type_of(vector_store.index) == "flat":
+        vector_store.index.remove_ids(np.fromiter(positions, dtype=np.int64))
+        remaining = [doc_id for position, doc_id in sorted(vector_store.index_to_docstore_id.items()) if position not in positions]
+        _replace_id_map(vector_store, dict(enumerate(remaining)))
+    else:
+        for position in positions:
+            del vector_store.index_to_docstore_id[position]
+    return len(positions)
+
+def store_vectors(vector_store):
+    """Returns the vectors of a store in index order, using exact cached embeddings where the index is lossy."""
+    vectors = reconstruct_vectors(vector_store.index)
+    cache = get_embedding_cache()
+    if cache and index_type_of(vector_store.index) in LOSSY_INDEX_TYPES:
+        hashes = {}
+        for position, doc_id in vector_store.index_to_docstore_id.items():
+            doc = vector_store.docstore.search(doc_id)
+            hashes[position] = doc.metadata.get("chunk_hash") or text_hash(doc.page_content)
+        exact = cache.get_many(config["azure_embedding_deployment"], list(hashes.values()))
+        for position, h in hashes.items():
+            if h in exact:
+                vectors[position] = exact[h]
+    return vectors
+
+def reindex_vector_store(vector_store, index_type: str):
+    """Rebuilds a store's FAISS index as index_type in place.
+
+    Live vectors keep their order; tombstoned positions are dropped and the rest renumbered.
+    """
+    live = sorted(vector_store.index_to_docstore_id.items())
+    vectors = store_vectors(vector_store)
+    if len(live) != len(vectors):
+        vectors = vectors[[position for position, _ in live]]
+        _replace_id_map(vector_store, {i: doc_id for i, (_, doc_id) in enumerate(live)})
+    vector_store.index = build_index(vectors, index_type if len(vectors) else "flat")
+    return vectors
+
+def apply_index_policy(vector_store):
+    """Switches a store to the configured index type (or the auto choice for its size) if it differs,
+    and compacts it once tombstones exceed the configured fraction of its vectors."""
+    ntotal = vector_store.index.ntotal
+    live = len(vector_store.index_to_docstore_id)
+    desired = config["index_type"]
+    if desired == "auto":
+        desired = choose_index_type(live)
+    current = index_type_of(vector_store.index)
+    if ntotal and current != desired:
+        print(f"Re-indexing {live} vectors from '{current}' to '{desired}'...")
+        reindex_vector_store(vector_store, desired)
+    elif ntotal and (ntotal - live) / ntotal > config["compact_threshold"]:
+        print(f"Compacting '{current}' index: dropping {ntotal - live} deleted of {ntotal} vectors...")
+        reindex_vector_store(vector_store, current)
 
 def get_retriever_for_project(project_id: str):
     """Loads the FAISS vector store for a project and returns a retriever."""
-    if not embeddings:
+    if not get_embeddings():
         print("Error: Embeddings not initialized. Cannot get retriever.")
         return None
 
@@ -112,17 +619,165 @@ def get_retriever_for_project(project_id: str):
         return None
 
     try:
-        # Ensure embeddings instance is the same as used for creation/saving
-        vector_store = FAISS.load_local(store_path, embeddings, allow_dangerous_deserialization=True)
+        # Loaded once here so a broken index is reported now; queries fetch it again through the store cache
+        load_vector_store(store_path)
         # Increase 'k' to retrieve more chunks if needed, adjust based on context window and desired detail
-        return vector_store.as_retriever(search_kwargs={'k': 4})
+        # Dense + BM25 ranks fused, so exact identifiers (KPI names, tickers, clause numbers) aren't missed.
+        # Dense-only search also goes through this retriever so tombstoned (deleted) chunks are skipped.
+        # Over-fetches candidates; build_context picks the diverse, non-overlapping ones that fit the token budget
+        candidates = config["context_candidates"]
+        return HybridRetriever(
+            store_path=store_path,
+            load_store=load_vector_store,
+            hybrid=config["hybrid_search"],
+            k=candidates,
+            fetch_k=max(20, candidates),
+        )
     except Exception as e:
         print(f"Error loading FAISS index for {project_id}: {e}")
         return None
 
+def get_federated_retriever(project_ids: list[str]):
+    """Returns a retriever over several projects' indexes as shards (a plain retriever for one project).
+
+    Shards are loaded in parallel; projects without an index are left out.
+    """
+    if len(project_ids) == 1:
+        return get_retriever_for_project(project_ids[0])
+    loaded = list(shard_pool().map(get_retriever_for_project, project_ids))
+    shards = {project_id: retriever for project_id, retriever in zip(project_ids, loaded) if retriever is not None}
+    if not shards:
+        return None
+    return FederatedRetriever(shards=shards, embed_query=embed_query, k=config["context_candidates"])
+
+class ChunkRef(NamedTuple):
+    """A chunk listed by content hash and metadata; load() reads its text (None if it was deleted since)."""
+    chunk_hash: str
+    metadata: dict
+    load: Callable[[], str | None]
+
+def _stored_text(docstore, doc_id: str) -> str | None:
+    doc = docstore.search(doc_id)
+    return doc.page_content if isinstance(doc, Document) else None
+
+def iter_store_chunks(vector_store, extra_metadata: dict | None = None) -> Iterator[ChunkRef]:
+    """Yields a ChunkRef for every chunk in a store; SQLite-stored text stays on disk until loaded."""
+    if vector_store is None:
+        return
+    extra_metadata = extra_metadata or {}
+    docstore = vector_store.docstore
+    if isinstance(docstore, SQLiteDocstore):
+        rows = docstore.iter_chunk_hashes(vector_store.index_to_docstore_id, vector_store.index.ntotal)
+        for doc_id, chunk_hash, metadata, text in rows:
+            # Older chunks were stored before hashes were recorded, so only their text is read here
+            yield ChunkRef(chunk_hash or text_hash(text), {**metadata, **extra_metadata}, partial(_stored_text, docstore, doc_id))
+    else:
+        for doc in docstore._dict.values():
+            chunk_hash = doc.metadata.get("chunk_hash") or text_hash(doc.page_content)
+            yield ChunkRef(chunk_hash, {**doc.metadata, **extra_metadata}, partial(getattr, doc, "page_content"))
+
+def iter_retriever_chunks(retriever) -> Iterator[ChunkRef]:
+    """Yields a ChunkRef for every chunk behind a retriever; a multi-project retriever's chunks name their project."""
+    if isinstance(retriever, FederatedRetriever):
+        for project_id, shard in retriever.shards.items():
+            yield from iter_store_chunks(shard.vector_store, {"project": project_id})
+    else:
+        yield from iter_store_chunks(retriever.vector_store)
+
+def embed_query(query: str) -> list[float]:
+    """Embeds a query with the shared embeddings client (the one loaded stores search with)."""
+    return get_embeddings().embed_query(query)
+
+def lookup_cached_answer(project_id: str, question: str):
+    """Returns (cached answer or None, question embedding) for a project's semantic answer cache."""
+    if not get_embeddings():
+        return None, None
+    store_path = get_vector_store_path(project_id)
+    query_vector = embeddings.embed_query(question)
+    return answer_cache.lookup(store_path, query_vector, version=index_signature(store_path)), query_vector
+
+def cache_answer(project_id: str, query_vector, answer: str, latency: float):
+    """Stores an answer in the project's semantic answer cache."""
+    if query_vector is None:
+        return
+    store_path = get_vector_store_path(project_id)
+    answer_cache.store(store_path, query_vector, answer, latency, version=index_signature(store_path))
+
 def format_docs(docs):
     """Helper function to format retrieved documents for the prompt."""
-    return "\n\n".join(f"--- Start Document Chunk ---\n{doc.page_content}\n--- End Document Chunk ---" for doc in docs)
+    return "\n\n".join(f"--- Start Document Chunk{_origin(doc)} ---\n{doc.page_content}\n--- End Document Chunk ---" for doc in docs)
+
+def _origin(doc) -> str:
+    # Chunks from a multi-project search name their project, so answers can attribute them
+    return f" (project: {doc.metadata['project']})" if "project" in doc.metadata else ""
+
+def _indexed_vectors(vector_store, doc_ids: list[str]) -> dict:
+    """Reads chunks' vectors back from a flat or HNSW index by position (None-safe; {} for other index types).
+
+    Those indexes keep the vectors exactly; quantized ones don't, and IVF needs a direct map built first.
+    """
+    if vector_store is None or index_type_of(vector_store.index) not in ("flat", "hnsw"):
+        return {}
+    id_map = vector_store.index_to_docstore_id
+    if isinstance(id_map, SQLiteIdMap):
+        positions = id_map.positions_of(doc_ids)
+    else:
+        wanted = set(doc_ids)
+        positions = {doc_id: position for position, doc_id in id_map.items() if doc_id in wanted}
+    return {doc_id: vector_store.index.reconstruct(int(position)) for doc_id, position in positions.items()}
+
+def _chunk_vectors(docs: list[Document], retriever=None) -> list:
+    """Returns the stored embeddings of retrieved chunks.
+
+    Chunks of flat and HNSW indexes are read back from their store's index; the rest come
+    from the embedding cache, embedding any misses.
+    """
+    if isinstance(retriever, FederatedRetriever):
+        shards = [retriever.shards.get(doc.metadata.get("project")) for doc in docs]
+    else:
+        shards = [retriever] * len(docs)
+    wanted = {}
+    for shard, doc in zip(shards, docs):
+        if isinstance(shard, HybridRetriever) and doc.id:
+            wanted.setdefault(shard.store_path, (shard, []))[1].append(doc.id)
+    stored = {}
+    for store_path, (shard, doc_ids) in wanted.items():
+        for doc_id, vector in _indexed_vectors(shard.vector_store, doc_ids).items():
+            stored[store_path, doc_id] = vector
+
+    vectors = [stored.get((getattr(shard, "store_path", None), doc.id)) for shard, doc in zip(shards, docs)]
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+    if missing:
+        texts = [docs[i].page_content for i in missing]
+        cache = get_embedding_cache()
+        if cache:
+            embedded = embed_with_cache(embedding_engine, cache, config["azure_embedding_deployment"], texts)[0]
+        else:
+            embedded = embedding_engine.embed(texts)
+        for i, vector in zip(missing, embedded):
+            vectors[i] = vector
+    return vectors
+
+def build_context(question: str, docs: list[Document], retriever=None) -> str:
+    """Turns over-fetched retrieval candidates into the prompt context.
+
+    Candidates are re-ranked with MMR, chunks sharing overlap text are merged, and the
+    result is packed to RAG_CONTEXT_TOKENS before formatting. retriever is the one that
+    found docs, whose indexes hold their vectors.
+    """
+    with span("context_assembly", candidates=len(docs)) as s:
+        if docs and get_embeddings():
+            docs = assemble_context(
+                embeddings.embed_query(question),
+                docs,
+                _chunk_vectors(docs, retriever),
+                max_tokens=config["context_max_tokens"],
+                count_tokens=embedding_engine.count_tokens,
+                lambda_mult=config["mmr_lambda"],
+            )
+        context = format_docs(docs)
+        s.set(chunks=len(docs), chars=len(context))
+    return context
 
 def setup_rag_chain(llm, retriever):
     """Sets up the RAG chain using Langchain Expression Language (LCEL)."""
@@ -140,10 +795,26 @@ Answer:"""
     
     custom_rag_prompt = PromptTemplate.from_template(template)
 
+    def retrieve_context(question: str) -> str:
+        with span("retrieval") as s:
+            docs = retriever.invoke(question)
+            s.set(chunks=len(docs))
+        return build_context(question, docs, retriever)
+
     rag_chain = (
-        {"context": retriever | format_docs, "question": RunnablePassthrough()}
+        {"context": RunnableLambda(retrieve_context), "question": RunnablePassthrough()}
         | custom_rag_prompt
         | llm
         | StrOutputParser()
     )
-    return rag_chain
\ No newline at end of file
+    return rag_chain
+
+def timed_stream(chunks: Iterable[str], timings: dict) -> Iterator[str]:
+    """Passes a token stream through, recording time-to-first-token and total latency (seconds) in timings."""
+    start = time.perf_counter()
+    for chunk in chunks:
+        if "ttft" not in timings:
+            timings["ttft"] = time.perf_counter() - start
+        yield chunk
+    timings.setdefault("ttft", time.perf_counter() - start)
+    timings["total"] = time.perf_counter() - start
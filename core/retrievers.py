@@ -0,0 +1,168 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+import faiss
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from .tracing import span
+
+
+def dense_search(vector_store, query: str, k: int, query_vector=None) -> list[tuple[str, float]]:
+    """Returns (docstore id, distance) for the k nearest chunks to a query, without loading their text.
+
+    query_vector is the query's embedding if the caller already has it (the store embeds it otherwise).
+    Positions missing from index_to_docstore_id are tombstones of deleted chunks; they are
+    skipped, searching wider until k live chunks are found or the index is exhausted.
+    """
+    if query_vector is None:
+        query_vector = vector_store._embed_query(query)
+    query_vector = np.array([query_vector], dtype=np.float32)
+    if vector_store._normalize_L2:
+        faiss.normalize_L2(query_vector)
+    ntotal = vector_store.index.ntotal
+    fetch = k
+    while True:
+        distances, indices = vector_store.index.search(query_vector, min(fetch, ntotal) or 1)
+        hits = [(vector_store.index_to_docstore_id.get(i), float(d)) for d, i in zip(distances[0], indices[0]) if i != -1]
+        hits = [(doc_id, d) for doc_id, d in hits if doc_id is not None]
+        if len(hits) >= k or fetch >= ntotal:
+            return hits[:k]
+        fetch *= 4
+
+
+def dense_search_ids(vector_store, query: str, k: int) -> list[str]:
+    """Returns the docstore ids of the k nearest chunks to a query."""
+    return [doc_id for doc_id, _ in dense_search(vector_store, query, k)]
+
+
+def reciprocal_rank_fusion(rankings: list[list[str]], k: int = 60) -> list[str]:
+    """Fuses several ranked id lists: each id scores sum(1 / (k + rank)) over the lists it appears in."""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class HybridRetriever(BaseRetriever):
+    """Retrieves chunks by fusing dense FAISS ranks with BM25 ranks (reciprocal rank fusion).
+
+    The store isn't held: load_store(store_path) fetches it once per query (and the search
+    and fetch steps share it), so the process-wide store cache alone decides what stays
+    resident and queries see the latest saved index.
+    Without hybrid (or a lexical index) it returns the dense ranking alone.
+    """
+
+    store_path: str
+    load_store: Callable[[str], Any]
+    hybrid: bool = True
+    k: int = 4
+    fetch_k: int = 20
+    rrf_k: int = 60
+
+    @property
+    def vector_store(self):
+        """The current saved store (None if its index has been deleted since)."""
+        return self.load_store(self.store_path)
+
+    def candidates(self, vector_store, query: str, query_vector=None) -> tuple[list[tuple[str, float]], list[tuple[str, float]]]:
+        """Returns the (id, L2 distance) dense hits and (id, BM25 score) lexical hits for a query."""
+        if vector_store is None:
+            return [], []
+        with span("dense_search", k=self.fetch_k):
+            dense = dense_search(vector_store, query, self.fetch_k, query_vector)
+        lexical = []
+        lexical_index = getattr(vector_store, "lexical_index", None) if self.hybrid else None
+        if lexical_index is not None:
+            with span("lexical_search", k=self.fetch_k):
+                lexical = lexical_index.search(query, self.fetch_k)
+        return dense, lexical
+
+    def fetch(self, vector_store, doc_ids: list[str]) -> dict[str, Document]:
+        """Loads chunks by docstore id; ids that are no longer stored are left out."""
+        docs = {}
+        if vector_store is None:
+            return docs
+        for doc_id in doc_ids:
+            doc = vector_store.docstore.search(doc_id)
+            if isinstance(doc, Document):
+                docs[doc_id] = doc
+        return docs
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+        vector_store = self.vector_store
+        dense, lexical = self.candidates(vector_store, query)
+        rankings = [[doc_id for doc_id, _ in dense]]
+        if lexical:
+            rankings.append([doc_id for doc_id, _ in lexical])
+        return list(self.fetch(vector_store, reciprocal_rank_fusion(rankings, self.rrf_k)[:self.k]).values())
+
+
+_shard_pool = None
+_shard_pool_lock = threading.Lock()
+
+
+def shard_pool() -> ThreadPoolExecutor:
+    """Process-wide pool for per-shard searches (FAISS and NumPy release the GIL while searching)."""
+    global _shard_pool
+    with _shard_pool_lock:
+        if _shard_pool is None:
+            _shard_pool = ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 2), thread_name_prefix="shard-search")
+        return _shard_pool
+
+
+class FederatedRetriever(BaseRetriever):
+    """Treats several projects' stores as shards of one index.
+
+    Each shard's dense and BM25 search runs in parallel. Dense L2 distances come from the
+    same embedding model and are compared directly across shards; BM25 scores depend on
+    each corpus's term statistics, so they are divided by the shard's best score first.
+    The two merged rankings are fused with RRF, and each hit is tagged with its project.
+    The query is embedded once, with embed_query, for every shard.
+    """
+
+    shards: dict[str, Any]  # project id -> HybridRetriever
+    embed_query: Callable[[str], Any]
+    k: int = 4
+    rrf_k: int = 60
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+        with span("embed_query"):
+            query_vector = self.embed_query(query)
+
+        def search(shard):
+            vector_store = shard.vector_store
+            return vector_store, *shard.candidates(vector_store, query, query_vector)
+
+        futures = {project_id: shard_pool().submit(search, shard) for project_id, shard in self.shards.items()}
+        dense, lexical, stores = [], [], {}
+        for project_id, future in futures.items():
+            stores[project_id], shard_dense, shard_lexical = future.result()
+            dense += [(distance, project_id, doc_id) for doc_id, distance in shard_dense]
+            top = shard_lexical[0][1] if shard_lexical else 0.0
+            lexical += [(score / top if top > 0 else 0.0, project_id, doc_id) for doc_id, score in shard_lexical]
+        dense.sort()
+        lexical.sort(reverse=True)
+        rankings = [[(project_id, doc_id) for _, project_id, doc_id in dense]]
+        if lexical:
+            rankings.append([(project_id, doc_id) for _, project_id, doc_id in lexical])
+
+        by_shard = {}
+        top_hits = reciprocal_rank_fusion(rankings, self.rrf_k)[:self.k]
+        for project_id, doc_id in top_hits:
+            by_shard.setdefault(project_id, []).append(doc_id)
+        fetched = {
+            project_id: shard_pool().submit(self.shards[project_id].fetch, stores[project_id], doc_ids)
+            for project_id, doc_ids in by_shard.items()
+        }
+        found = {}
+        for project_id, future in fetched.items():
+            for doc_id, doc in future.result().items():
+                # Copied so the tag never leaks into a shard's in-memory docstore
+                found[project_id, doc_id] = Document(id=doc_id, page_content=doc.page_content, metadata={**doc.metadata, "project": project_id})
+        return [found[hit] for hit in top_hits if hit in found]
@@ -0,0 +1,141 @@
+import os
+import threading
+import weakref
+from collections import OrderedDict
+
+from .index_factory import index_nbytes
+
+
+def index_signature(store_path: str, index_name: str = "index"):
+    """Returns (mtime_ns, size) of a store's index file, or None if it doesn't exist."""
+    try:
+        st = os.stat(os.path.join(store_path, f"{index_name}.faiss"))
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def estimate_store_bytes(vector_store) -> int:
+    """Rough resident size of a loaded FAISS store: the index's codes and graph, chunk text and BM25 postings."""
+    size = index_nbytes(vector_store.index)
+    docs = getattr(vector_store.docstore, "_dict", None)
+    if docs:
+        size += sum(len(doc.page_content) + 200 for doc in docs.values())
+    lexical_index = getattr(vector_store, "lexical_index", None)
+    if lexical_index is not None:
+        size += lexical_index.nbytes
+    return size
+
+
+class StoreCache:
+    """Process-wide LRU cache of loaded FAISS stores, bounded by an estimated memory budget.
+
+    Entries are keyed by store path and validated against the index file's mtime/size,
+    so a store rewritten by another process is reloaded on the next access.
+
+    A store too large for the budget on its own is kept pinned instead, one at a time, so
+    a project bigger than the budget isn't reloaded on every query. Stores evicted or
+    unpinned are still found through weak references while someone else holds them.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # store_path -> (signature, store, size)
+        self._pinned = None  # (store_path, signature, store) of the last store over the budget
+        self._live = {}  # store_path -> (signature, weak reference to the last store handed out, size)
+        self._lock = threading.Lock()
+        self._path_locks = {}
+
+    def _path_lock(self, store_path: str) -> threading.Lock:
+        with self._lock:
+            return self._path_locks.setdefault(store_path, threading.Lock())
+
+    def get(self, store_path: str, loader):
+        """Returns the cached store for store_path, calling loader() on a miss or stale entry."""
+        signature = index_signature(store_path)
+        if signature is None:
+            self.invalidate(store_path)
+            return None
+
+        with self._lock:
+            store = self._lookup(store_path, signature)
+        if store is not None:
+            return store
+
+        # Load outside the global lock so other projects aren't blocked, but only once per path
+        with self._path_lock(store_path):
+            with self._lock:
+                store = self._lookup(store_path, signature)
+            if store is not None:
+                return store
+            store = loader()
+            # Cache under the signature read before loading: if a writer saved meanwhile,
+            # the entry is stale on arrival and the next access reloads it
+            self.put(store_path, store, signature)
+            return store
+
+    def _lookup(self, store_path: str, signature):
+        """Returns the store loaded from signature if it is cached, pinned or still alive; call under _lock."""
+        entry = self._entries.get(store_path)
+        if entry and entry[0] == signature:
+            self._entries.move_to_end(store_path)
+            return entry[1]
+        if self._pinned and self._pinned[:2] == (store_path, signature):
+            return self._pinned[2]
+        live = self._live.get(store_path)
+        store = live[1]() if live and live[0] == signature else None
+        if store is not None:
+            # Found still in use elsewhere: cache it again rather than holding a second copy
+            self._insert(store_path, signature, store, live[2])
+        return store
+
+    def put(self, store_path: str, vector_store, signature=None):
+        """Inserts or replaces the entry for store_path.
+
+        signature is the index file signature the store was loaded from; it defaults to the
+        current on-disk one, for writers that have just saved the store themselves.
+        """
+        if signature is None:
+            signature = index_signature(store_path)
+        size = estimate_store_bytes(vector_store)
+        with self._lock:
+            self._forget(store_path)
+            if signature is not None:
+                self._insert(store_path, signature, vector_store, size)
+
+    def _insert(self, store_path: str, signature, vector_store, size: int):
+        try:
+            self._live[store_path] = (signature, weakref.ref(vector_store), size)
+        except TypeError:
+            pass  # Not weak-referenceable (e.g. a stand-in in tests); it is just not found once evicted
+        self._entries.pop(store_path, None)
+        if size > self.max_bytes:
+            self._pinned = (store_path, signature, vector_store)
+            return
+        self._entries[store_path] = (signature, vector_store, size)
+        self._evict()
+
+    def _forget(self, store_path: str):
+        self._entries.pop(store_path, None)
+        self._live.pop(store_path, None)
+        if self._pinned and self._pinned[0] == store_path:
+            self._pinned = None
+
+    def invalidate(self, store_path: str):
+        with self._lock:
+            self._forget(store_path)
+
+    def _evict(self):
+        total = sum(entry[2] for entry in self._entries.values())
+        while total > self.max_bytes and len(self._entries) > 1:
+            _, (_, _, size) = self._entries.popitem(last=False)
+            total -= size
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "pinned": self._pinned[0] if self._pinned else None,
+                "bytes": sum(entry[2] for entry in self._entries.values()),
+                "max_bytes": self.max_bytes,
+            }
@@ -0,0 +1,228 @@
+"""Timed spans and metrics for the ingestion, RAG and agent pipeline.
+
+Disabled by default: span() then returns a shared no-op object, so instrumented code
+pays for one flag check. When enabled, every finished span is logged as a JSON line
+(logger "rag.trace") and aggregated into Prometheus-style histograms that can be
+written to a file and/or served over HTTP.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+logger = logging.getLogger("rag.trace")
+_enabled = False
+_metrics_path = None
+_last_write = 0.0
+_lock = threading.Lock()
+_histograms = {}  # span name -> {"buckets": [...], "sum": float, "count": int}
+_attribute_totals = {}  # (span name, attribute) -> float
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Span:
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.parent = _current_span.get()
+        self._token = _current_span.set(self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def set(self, **attrs):
+        """Adds attributes (e.g. token or chunk counts) to the span."""
+        self.attrs.update(attrs)
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        _finish(self.name, seconds, self.attrs, self.parent)
+        return False
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def span(name: str, **attrs):
+    """Context manager timing one pipeline stage; numeric attributes are summed into metrics."""
+    if not _enabled:
+        return _NOOP_SPAN
+    return _Span(name, attrs)
+
+
+def record(name: str, seconds: float, **attrs):
+    """Records a stage timed elsewhere (e.g. inside a worker process)."""
+    if _enabled:
+        _finish(name, seconds, attrs, _current_span.get())
+
+
+def _finish(name: str, seconds: float, attrs: dict, parent):
+    with _lock:
+        histogram = _histograms.setdefault(name, {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0})
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                histogram["buckets"][i] += 1
+        histogram["sum"] += seconds
+        histogram["count"] += 1
+        for key, value in attrs.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                _attribute_totals[(name, key)] = _attribute_totals.get((name, key), 0) + value
+
+    logger.info(json.dumps({"span": name, "parent": parent, "seconds": round(seconds, 6), "ts": time.time(), **attrs}, default=str))
+    _maybe_write_metrics()
+
+
+def render_prometheus() -> str:
+    """Returns all span metrics in the Prometheus text exposition format."""
+    lines = [
+        "# HELP rag_span_seconds Time spent in each pipeline stage.",
+        "# TYPE rag_span_seconds histogram",
+    ]
+    with _lock:
+        for name, histogram in sorted(_histograms.items()):
+            for bound, count in zip(BUCKETS, histogram["buckets"]):
+                lines.append(f'rag_span_seconds_bucket{{span="{name}",le="{bound}"}} {count}')
+            lines.append(f'rag_span_seconds_bucket{{span="{name}",le="+Inf"}} {histogram["count"]}')
+            lines.append(f'rag_span_seconds_sum{{span="{name}"}} {histogram["sum"]}')
+            lines.append(f'rag_span_seconds_count{{span="{name}"}} {histogram["count"]}')
+        lines += [
+            "# HELP rag_span_attribute_total Sum of numeric span attributes (tokens, chunks, ...).",
+            "# TYPE rag_span_attribute_total counter",
+        ]
+        for (name, key), total in sorted(_attribute_totals.items()):
+            lines.append(f'rag_span_attribute_total{{span="{name}",attribute="{key}"}} {total}')
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(path: str):
+    with open(path, "w") as f:
+        f.write(render_prometheus())
+
+
+def _maybe_write_metrics():
+    global _last_write
+    if _metrics_path and time.monotonic() - _last_write >= 1.0:
+        _last_write = time.monotonic()
+        write_metrics(_metrics_path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def configure(enabled: bool, log_path: str | None = None, metrics_path: str | None = None, metrics_port: int | None = None,
+              metrics_host: str = "127.0.0.1"):
+    """Turns tracing on or off and sets up its exporters (idempotent per process).
+
+    The metrics endpoint listens on metrics_host, loopback only unless configured otherwise.
+    """
+    global _enabled, _metrics_path
+    _enabled = enabled
+    if not enabled:
+        return
+    if not logger.handlers:
+        handler = logging.FileHandler(log_path) if log_path else logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    if metrics_path and not _metrics_path:
+        _metrics_path = metrics_path
+        atexit.register(write_metrics, metrics_path)
+    if metrics_port:
+        _start_metrics_server(metrics_host, metrics_port)
+
+
+_server = None
+
+
+def _start_metrics_server(host: str, port: int):
+    global _server
+    if _server is not None:
+        return
+    try:
+        _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        print(f"Warning: could not start metrics endpoint on {host}:{port}. Error: {e}")
+        return
+    threading.Thread(target=_server.serve_forever, name="metrics-endpoint", daemon=True).start()
+    print(f"Serving Prometheus metrics on http://{host}:{port}/metrics")
+
+
+def llm_callbacks() -> list:
+    """Callbacks to pass to a chat model so its calls are traced (empty when tracing is off)."""
+    return [TracingCallback()] if _enabled else []
+
+
+class TracingCallback(BaseCallbackHandler):
+    """Records LLM time-to-first-token and completion spans with token usage."""
+
+    def __init__(self):
+        self._runs = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._runs[run_id] = {"start": time.perf_counter(), "first_token": None}
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._runs[run_id] = {"start": time.perf_counter(), "first_token": None}
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        run = self._runs.get(run_id)
+        if run and run["first_token"] is None:
+            run["first_token"] = time.perf_counter()
+            record("llm_ttft", run["first_token"] - run["start"])
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        run = self._runs.pop(run_id, None)
+        if not run:
+            return
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        record(
+            "llm_completion",
+            time.perf_counter() - run["start"],
+            prompt_tokens=usage.get("prompt_tokens", 0),
+            completion_tokens=usage.get("completion_tokens", 0),
+        )
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        run = self._runs.pop(run_id, None)
+        if run:
+            record("llm_completion", time.perf_counter() - run["start"], error=type(error).__name__)
@@ -1,8 +1,14 @@
 import os
+from functools import lru_cache
 from dotenv import load_dotenv
 
+@lru_cache(maxsize=None)
 def load_config():
-    """Loads API keys and Azure configuration from .env file."""
+    """Loads API keys and Azure configuration from .env file.
+
+    Read once per process (Streamlit re-runs the app script on every interaction); the
+    returned dict is shared, so settings changed at runtime are seen by every module.
+    """
     load_dotenv()
     config = {
         # Azure OpenAI Config
@@ -11,6 +17,32 @@ def load_config():
         "azure_api_version": os.getenv("AZURE_OPENAI_API_VERSION"),
         "azure_chat_deployment": os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT_NAME"),
         "azure_embedding_deployment": os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME"),
+        # Performance tuning
+        "store_cache_mb": int(os.getenv("RAG_STORE_CACHE_MB", "1024")),
+        "loader_workers": int(os.getenv("RAG_LOADER_WORKERS", str(os.cpu_count() or 1))),
+        "ingest_batch_size": int(os.getenv("RAG_INGEST_BATCH_SIZE", "256")),
+        "ingest_workers": int(os.getenv("RAG_INGEST_WORKERS", "2")),
+        "embed_concurrency": int(os.getenv("RAG_EMBED_CONCURRENCY", "4")),
+        "embed_batch_tokens": int(os.getenv("RAG_EMBED_BATCH_TOKENS", "64000")),
+        "index_type": os.getenv("RAG_INDEX_TYPE", "auto"),
+        "docstore": os.getenv("RAG_DOCSTORE", "pickle"),
+        "compact_threshold": float(os.getenv("RAG_COMPACT_THRESHOLD", "0.2")),
+        "context_max_tokens": int(os.getenv("RAG_CONTEXT_TOKENS", "5000")),
+        "context_candidates": int(os.getenv("RAG_CONTEXT_CANDIDATES", "12")),
+        "mmr_lambda": float(os.getenv("RAG_MMR_LAMBDA", "0.7")),
+        "map_concurrency": int(os.getenv("RAG_MAP_CONCURRENCY", "8")),
+        "map_tokens_in_flight": int(os.getenv("RAG_MAP_TOKENS_IN_FLIGHT", "60000")),
+        "reduce_tokens": int(os.getenv("RAG_REDUCE_TOKENS", "6000")),
+        "map_max_chunks": int(os.getenv("RAG_MAP_MAX_CHUNKS", "500")),
+        "hybrid_search": os.getenv("RAG_HYBRID_SEARCH", "true").lower() in ("1", "true", "yes"),
+        "tracing": os.getenv("RAG_TRACING", "false").lower() in ("1", "true", "yes"),
+        "trace_log": os.getenv("RAG_TRACE_LOG"),
+        "metrics_path": os.getenv("RAG_METRICS_PATH"),
+        "metrics_port": int(os.getenv("RAG_METRICS_PORT", "0")) or None,
+        "metrics_host": os.getenv("RAG_METRICS_HOST", "127.0.0.1"),
+        "answer_cache_threshold": float(os.getenv("RAG_ANSWER_CACHE_THRESHOLD", "0.95")),
+        "answer_cache_ttl": float(os.getenv("RAG_ANSWER_CACHE_TTL", "3600")),
+        "answer_cache_size": int(os.getenv("RAG_ANSWER_CACHE_SIZE", "256")),
     }
     # Basic validation
     if not all([config["azure_endpoint"], config["azure_api_key"], config["azure_api_version"], config["azure_chat_deployment"], config["azure_embedding_deployment"]]):
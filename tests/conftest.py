@@ -0,0 +1,58 @@
+import os
+import sys
+
+import pytest
+import tiktoken
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_embedding_server import FakeEmbeddingServer  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def estimated_token_counts(monkeypatch):
+    """Counts tokens as len(text) // 4 + 1 (the offline fallback), so packing is deterministic."""
+    def unavailable(name):
+        raise ValueError("tiktoken encodings are not available in tests")
+    monkeypatch.setattr(tiktoken, "get_encoding", unavailable)
+
+
+@pytest.fixture
+def embedding_server():
+    server = FakeEmbeddingServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def azure_embeddings(embedding_server):
+    """The app's embeddings client pointed at the fake endpoint, with its own retries off."""
+    from langchain_openai import AzureOpenAIEmbeddings
+
+    return AzureOpenAIEmbeddings(
+        azure_deployment="fake-embedding",
+        openai_api_version="2024-02-01",
+        azure_endpoint=embedding_server.url,
+        openai_api_key="fake",
+        max_retries=0,
+        check_embedding_ctx_length=False,
+    )
+
+
+@pytest.fixture
+def rag_env(tmp_path, monkeypatch):
+    """core.rag with a temporary data directory, no embedding cache and deterministic fake embeddings."""
+    from benchmarks.fakes import FakeEmbeddings
+    from core import rag
+    from core.store_cache import StoreCache
+
+    monkeypatch.setattr(rag, "VECTOR_STORE_BASE_PATH", str(tmp_path / "data"))
+    monkeypatch.setattr(rag, "embedding_cache", None)
+    monkeypatch.setattr(rag, "_embedding_cache_initialized", True)
+    monkeypatch.setattr(rag, "store_cache", StoreCache(1 << 30))
+    for name in ("embeddings", "embedding_engine", "_embeddings_initialized"):
+        monkeypatch.setattr(rag, name, getattr(rag, name))
+    for key in ("azure_embedding_deployment", "docstore", "index_type", "compact_threshold"):
+        monkeypatch.setitem(rag.config, key, rag.config[key])
+    rag.set_embeddings(FakeEmbeddings(dim=32), deployment="fake-embedding")
+    return rag
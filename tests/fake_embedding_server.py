@@ -0,0 +1,104 @@
+"""A local HTTP server that speaks the Azure OpenAI embeddings API, for tests.
+
+Vectors are derived from the text alone (see fake_vector), so callers can check that
+results come back aligned with their inputs. Failures and latency are scripted per test.
+"""
+import array
+import base64
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DIM = 8
+
+
+def fake_vector(text: str) -> list[float]:
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    return [float(b) for b in digest[:DIM]]
+
+
+class FakeEmbeddingServer:
+    """Records every request it receives and answers from a failure script.
+
+    failures is a list of (status, headers) consumed one per request before normal
+    responses resume; fail_after makes every request after the first n fail with 400.
+    delay(texts) returns the seconds to sleep before answering a request.
+    """
+
+    def __init__(self):
+        self.requests = []  # Texts of each successfully answered request, in arrival order
+        self.failures = []
+        self.fail_after = None
+        self.delay = lambda texts: 0.0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._httpd.server_address[1]}/"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def _next_failure(self):
+        with self._lock:
+            if self.fail_after is not None and len(self.requests) >= self.fail_after:
+                return 400, {}
+            return self.failures.pop(0) if self.failures else None
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status: int, body: dict, headers: dict | None = None):
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+                with server._lock:
+                    server.in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server.in_flight)
+                try:
+                    time.sleep(server.delay(texts))
+                    failure = server._next_failure()
+                    if failure:
+                        status, headers = failure
+                        self._reply(status, {"error": {"message": "scripted failure", "code": str(status)}}, headers)
+                        return
+                    data = []
+                    for i, text in enumerate(texts):
+                        vector = fake_vector(text)
+                        if body.get("encoding_format") == "base64":
+                            vector = base64.b64encode(array.array("f", vector).tobytes()).decode("ascii")
+                        data.append({"object": "embedding", "index": i, "embedding": vector})
+                    with server._lock:
+                        server.requests.append(texts)
+                    self._reply(200, {"object": "list", "data": data, "model": body.get("model", "fake"),
+                                      "usage": {"prompt_tokens": 0, "total_tokens": 0}})
+                finally:
+                    with server._lock:
+                        server.in_flight -= 1
+
+        return Handler
@@ -0,0 +1,109 @@
+import json
+import threading
+import time
+from collections import Counter
+
+import pytest
+
+from benchmarks.fakes import FakeChatModel
+from test_index_updates import _document
+
+
+@pytest.fixture
+def batch(rag_env, tmp_path):
+    import batch_qa
+
+    for i, project in enumerate(("p", "q")):
+        assert rag_env.ingest_files(project, [_document(tmp_path, project, i)])
+    return batch_qa
+
+
+def _fake_llm(deployment: str):
+    return FakeChatModel(ttft=0.0, token_latency=0.0, n_tokens=8)
+
+
+def _questions(n: int, projects=("p", "q"), deployments=("d1", "d2")) -> list[dict]:
+    return [
+        {"id": f"{i}", "project": projects[i % len(projects)], "deployment": deployments[i // len(projects) % len(deployments)],
+         "question": f"What was the revenue in quarter {i}?"}
+        for i in range(n)
+    ]
+
+
+def _records(path) -> list[dict]:
+    return [json.loads(line) for line in open(path, encoding="utf-8")]
+
+
+def test_concurrency_stays_within_the_project_and_deployment_limits(batch, tmp_path, monkeypatch):
+    lock = threading.Lock()
+    running, peaks = Counter(), Counter()
+    deployments = {}
+    answer = batch.decide_and_act
+
+    def llm_factory(deployment):
+        deployments[deployment] = llm = _fake_llm(deployment)
+        return llm
+
+    def tracked(question, chain, retriever, llm, timings, confirm=False):
+        keys = [("project", retriever.store_path), ("deployment", next(d for d, m in deployments.items() if m is llm))]
+        with lock:
+            for key in keys:
+                running[key] += 1
+                peaks[key] = max(peaks[key], running[key])
+        try:
+            time.sleep(0.02)  # Long enough for the workers to pile up
+            return answer(question, chain, retriever, llm, timings, confirm=confirm)
+        finally:
+            with lock:
+                for key in keys:
+                    running[key] -= 1
+
+    monkeypatch.setattr(batch, "decide_and_act", tracked)
+    out = tmp_path / "answers.jsonl"
+
+    counts = batch.run_batch(_questions(24), str(out), workers=8, per_project=2, per_deployment=3, llm_factory=llm_factory)
+
+    assert counts == {"answered": 24, "failed": 0, "skipped": 0}
+    assert max(peak for (kind, _), peak in peaks.items() if kind == "project") == 2
+    assert max(peak for (kind, _), peak in peaks.items() if kind == "deployment") == 3
+    assert sorted(record["id"] for record in _records(out)) == sorted(str(i) for i in range(24))
+
+
+def test_a_batch_resumes_after_partial_output(batch, tmp_path):
+    out = tmp_path / "answers.jsonl"
+    questions = _questions(6)
+    with open(out, "w", encoding="utf-8") as f:
+        for item in questions[:3]:
+            f.write(json.dumps({**item, "status": "ok", "answer": "earlier"}) + "\n")
+        f.write('{"id": "3", "status": "o')  # Cut off mid-write
+
+    counts = batch.run_batch(questions, str(out), workers=4, llm_factory=_fake_llm)
+
+    assert counts == {"answered": 3, "failed": 0, "skipped": 3}
+    lines = open(out, encoding="utf-8").read().splitlines()
+    assert lines[3] == '{"id": "3", "status": "o'  # The cut-off line is left alone, not glued to the next record
+    answered = [json.loads(line) for line in lines[4:]]
+    assert sorted(record["id"] for record in answered) == ["3", "4", "5"]
+    assert batch.completed_ids(str(out)) == {str(i) for i in range(6)}
+
+
+def test_failed_questions_are_retried_on_the_next_run(batch, tmp_path):
+    out = tmp_path / "answers.jsonl"
+    questions = _questions(4)
+
+    def flaky_llm(deployment):
+        if deployment == "d2":
+            raise ConnectionError("deployment unavailable")
+        return _fake_llm(deployment)
+
+    counts = batch.run_batch(questions, str(out), workers=4, llm_factory=flaky_llm)
+    failed = {record["id"] for record in _records(out) if record["status"] == "error"}
+    assert counts == {"answered": 2, "failed": 2, "skipped": 0}
+    assert failed == {item["id"] for item in questions if item["deployment"] == "d2"}
+    assert all("ConnectionError" in record["error"] for record in _records(out) if record["status"] == "error")
+
+    counts = batch.run_batch(questions, str(out), workers=4, llm_factory=_fake_llm)
+
+    assert counts == {"answered": 2, "failed": 0, "skipped": 2}
+    retried = _records(out)[4:]
+    assert {record["id"] for record in retried} == failed and all(record["status"] == "ok" for record in retried)
@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+from langchain.schema import Document
+
+from core.context import merge_overlaps, mmr_order, pack_to_budget
+from core.utils import load_config
+
+
+def _chunks(n: int, chars: int = 5000) -> list[Document]:
+    return [Document(page_content=str(i) * chars, metadata={"page": i}) for i in range(n)]
+
+
+def test_default_budget_is_no_larger_than_four_prose_chunks():
+    assert load_config()["context_max_tokens"] <= 4 * 5000 / 4.0
+
+
+@pytest.mark.parametrize("chars_per_token", [4.0, 3.0])  # English prose, number-dense tables
+def test_default_budget_holds_at_least_three_chunks(chars_per_token):
+    budget = load_config()["context_max_tokens"]
+    packed = pack_to_budget(_chunks(6), budget, lambda text: int(len(text) / chars_per_token) + 1)
+
+    assert len(packed) >= 3
+    assert all(len(doc.page_content) == 5000 for doc in packed[:2])
+
+
+def test_chunk_that_overflows_the_budget_is_truncated_not_dropped():
+    packed = pack_to_budget(_chunks(3, chars=400), 250, len, overhead=0, min_tail_tokens=50)
+
+    assert [len(doc.page_content) for doc in packed] == [250]
+
+    packed = pack_to_budget(_chunks(3, chars=100), 250, len, overhead=0, min_tail_tokens=40)
+    assert [len(doc.page_content) for doc in packed] == [100, 100, 50]
+
+
+def test_small_remainders_are_left_unused():
+    packed = pack_to_budget(_chunks(3, chars=100), 230, len, overhead=0, min_tail_tokens=40)
+
+    assert [len(doc.page_content) for doc in packed] == [100, 100]
+
+
+def test_mmr_puts_a_diverse_chunk_before_a_near_duplicate():
+    query = [1.0, 0.0, 0.0]
+    vectors = [[1.0, 0.1, 0.0], [1.0, 0.12, 0.0], [0.7, 0.0, 0.7]]
+
+    assert mmr_order(query, vectors, lambda_mult=0.5) == [0, 2, 1]
+    assert mmr_order(query, vectors, lambda_mult=1.0) == [0, 1, 2]  # Relevance alone
+
+
+def test_mmr_orders_every_candidate_once():
+    vectors = np.random.default_rng(0).random((20, 8))
+
+    assert sorted(mmr_order(vectors[3], vectors)) == list(range(20))
+    assert mmr_order(vectors[3], vectors)[0] == 3
+
+
+def _page(text: str, page: int = 0, source: str = "a.pdf") -> Document:
+    return Document(page_content=text, metadata={"source": source, "page": page})
+
+
+def test_chunks_sharing_overlap_text_merge_into_one_span():
+    text = "".join(f"sentence {i}. " for i in range(100))
+    first, second = text[:600], text[500:]
+
+    merged = merge_overlaps([_page(second), _page("unrelated " * 20), _page(first)])
+
+    assert [doc.page_content for doc in merged] == [text, "unrelated " * 20]
+
+
+def test_contained_chunks_are_dropped_and_other_pages_kept_apart():
+    text = "".join(f"sentence {i}. " for i in range(100))
+
+    merged = merge_overlaps([_page(text), _page(text[100:300]), _page(text[500:], page=1), _page(text[:600], page=0, source="b.pdf")])
+
+    assert [(doc.metadata["source"], doc.metadata["page"], len(doc.page_content)) for doc in merged] == [
+        ("a.pdf", 0, len(text)), ("a.pdf", 1, len(text) - 500), ("b.pdf", 0, 600),
+    ]
+
+
+def test_short_coincidental_overlaps_are_not_merged():
+    merged = merge_overlaps([_page("alpha beta gamma"), _page("gamma delta")])
+
+    assert len(merged) == 2
+
+
+@pytest.mark.parametrize("docstore", ["pickle", "sqlite"])
+def test_chunk_vectors_are_read_from_an_exact_index(rag_env, tmp_path, monkeypatch, docstore):
+    from test_index_updates import _document
+
+    rag = rag_env
+    rag.config["docstore"] = docstore
+    assert rag.ingest_files("p", [_document(tmp_path, "a", 0)])
+    assert rag.ingest_files("q", [_document(tmp_path, "b", 1)])
+    retrievers = [rag.get_retriever_for_project("p"), rag.get_federated_retriever(["p", "q"])]
+    found = [retriever.invoke("revenue") for retriever in retrievers]
+    expected = [rag.embedding_engine.embed([doc.page_content for doc in docs]) for docs in found]
+    monkeypatch.setattr(rag.embedding_engine, "embed", lambda texts: pytest.fail("embedded stored chunks"))
+
+    assert {doc.metadata["project"] for doc in found[1]} == {"p", "q"}
+    for retriever, docs, vectors in zip(retrievers, found, expected):
+        np.testing.assert_allclose(rag._chunk_vectors(docs, retriever), vectors, rtol=1e-5)
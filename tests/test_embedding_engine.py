@@ -0,0 +1,177 @@
+import types
+
+import openai
+import pytest
+
+import core.embedding_engine as engine_module
+from core.embedding_cache import EmbeddingCache, embed_with_cache, text_hash
+from core.embedding_engine import EmbeddingEngine, _AdaptiveLimiter
+from fake_embedding_server import fake_vector
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Records the engine's backoff waits instead of sleeping."""
+    waits = []
+    monkeypatch.setattr(engine_module, "time", types.SimpleNamespace(sleep=waits.append))
+    return waits
+
+
+def _texts(n: int, words: int = 5) -> list[str]:
+    return [f"chunk {i} " + "word " * words for i in range(n)]
+
+
+# --- Token-bounded packing ---
+
+def test_pack_batches_respects_token_and_size_limits(azure_embeddings):
+    engine = EmbeddingEngine(azure_embeddings, max_batch_tokens=20, max_batch_size=3)
+    texts = ["x" * 20, "x" * 20, "x" * 20, "x" * 100, "x", "x", "x", "x"]  # 6, 6, 6, 26, then 1-token texts
+
+    batches = engine.pack_batches(texts)
+
+    assert batches == [[0, 1, 2], [3], [4, 5, 6], [7]]
+    assert [i for batch in batches for i in batch] == list(range(len(texts)))
+
+
+def test_requests_stay_under_token_budget(embedding_server, azure_embeddings):
+    engine = EmbeddingEngine(azure_embeddings, max_concurrency=2, max_batch_tokens=50)
+    texts = _texts(40)
+
+    engine.embed(texts)
+
+    assert len(embedding_server.requests) > 1
+    for request in embedding_server.requests:
+        assert sum(engine.count_tokens(text) for text in request) <= 50
+    assert sorted(text for request in embedding_server.requests for text in request) == sorted(texts)
+
+
+# --- Concurrency and ordering ---
+
+def test_vectors_align_with_inputs_when_batches_finish_out_of_order(embedding_server, azure_embeddings):
+    # Earlier batches answer slowest, so completions arrive in reverse order
+    embedding_server.delay = lambda texts: 0.2 / (1 + int(texts[0].split()[1]))
+    engine = EmbeddingEngine(azure_embeddings, max_concurrency=4, max_batch_size=2)
+    texts = _texts(16)
+
+    vectors = engine.embed(texts)
+
+    assert vectors == [fake_vector(text) for text in texts]
+    assert embedding_server.max_in_flight > 1
+
+
+def test_on_batch_reports_every_text_once(embedding_server, azure_embeddings):
+    engine = EmbeddingEngine(azure_embeddings, max_concurrency=3, max_batch_size=3)
+    texts = _texts(10)
+    seen = {}
+
+    engine.embed(texts, on_batch=lambda indices, vectors: seen.update(zip(indices, vectors)))
+
+    assert seen == {i: fake_vector(text) for i, text in enumerate(texts)}
+
+
+# --- Throttling and retries ---
+
+def test_retry_after_headers_are_honoured(embedding_server, azure_embeddings, sleeps):
+    embedding_server.failures = [(429, {"retry-after": "0.25"}), (429, {"retry-after-ms": "40"})]
+    engine = EmbeddingEngine(azure_embeddings, max_concurrency=1)
+
+    vectors = engine.embed(["a", "b"])
+
+    assert sleeps == [0.25, 0.04]
+    assert vectors == [fake_vector("a"), fake_vector("b")]
+
+
+def test_backoff_grows_exponentially_without_retry_after(embedding_server, azure_embeddings, sleeps):
+    embedding_server.failures = [(429, {}), (503, {}), (429, {})]
+    engine = EmbeddingEngine(azure_embeddings, max_concurrency=1)
+
+    engine.embed(["a"])
+
+    assert len(sleeps) == 3
+    for wait, base in zip(sleeps, (1, 2, 4)):
+        assert base <= wait < 2 * base
+
+
+def test_gives_up_after_max_retries(embedding_server, azure_embeddings, sleeps):
+    embedding_server.failures = [(429, {"retry-after-ms": "1"})] * 3
+    engine = EmbeddingEngine(azure_embeddings, max_concurrency=1, max_retries=2)
+
+    with pytest.raises(openai.RateLimitError):
+        engine.embed(["a"])
+    assert len(sleeps) == 2
+
+
+def test_non_retryable_errors_fail_fast(embedding_server, azure_embeddings, sleeps):
+    embedding_server.failures = [(400, {})]
+    engine = EmbeddingEngine(azure_embeddings, max_concurrency=1)
+
+    with pytest.raises(openai.BadRequestError):
+        engine.embed(["a"])
+    assert sleeps == []
+
+
+# --- AIMD concurrency limit ---
+
+def test_limiter_halves_on_throttle_and_grows_after_a_run_of_successes():
+    limiter = _AdaptiveLimiter(8)
+
+    for expected in (4, 2, 1, 1):
+        limiter.acquire()
+        limiter.release(throttled=True)
+        assert limiter.limit == expected
+
+    # Grows by one after `limit` consecutive successes, up to the maximum
+    limits = []
+    for _ in range(40):
+        limiter.acquire()
+        limiter.release(throttled=False)
+        limits.append(limiter.limit)
+    assert limits[:6] == [2, 2, 3, 3, 3, 4]
+    assert limits[-1] == 8
+
+
+def test_throttling_shrinks_concurrency_and_successes_restore_it(embedding_server, azure_embeddings, sleeps):
+    embedding_server.failures = [(429, {"retry-after-ms": "1"})] * 2
+    engine = EmbeddingEngine(azure_embeddings, max_concurrency=4, max_batch_size=1)
+
+    engine.embed(_texts(4))
+    # Two halvings from 4 can't be recovered by the 4 successes that follow them
+    assert engine.limiter.limit < 4
+
+    engine.embed(_texts(20))
+    assert engine.limiter.limit == 4
+
+
+# --- Checkpoint and resume ---
+
+def test_interrupted_ingest_resumes_from_checkpointed_batches(embedding_server, azure_embeddings, tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite"))
+    engine = EmbeddingEngine(azure_embeddings, max_concurrency=1, max_batch_size=2, max_retries=0)
+    texts = _texts(10)
+    embedding_server.fail_after = 2  # The third request and later fail for good
+
+    with pytest.raises(openai.BadRequestError):
+        embed_with_cache(engine, cache, "fake-embedding", texts)
+    checkpointed = cache.get_many("fake-embedding", [text_hash(text) for text in texts])
+    assert len(checkpointed) == 4
+
+    embedding_server.fail_after = None
+    embedding_server.requests.clear()
+    vectors, hits, misses = embed_with_cache(engine, cache, "fake-embedding", texts)
+
+    assert vectors == [fake_vector(text) for text in texts]
+    assert (hits, misses) == (4, 6)
+    assert sorted(text for request in embedding_server.requests for text in request) == sorted(texts[4:])
+
+
+def test_cached_and_duplicate_texts_are_not_re_embedded(embedding_server, azure_embeddings, tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite"))
+    engine = EmbeddingEngine(azure_embeddings)
+
+    embed_with_cache(engine, cache, "fake-embedding", ["a", "b", "a"])
+    embedding_server.requests.clear()
+    vectors, hits, misses = embed_with_cache(engine, cache, "fake-embedding", ["a", "b", "c"])
+
+    assert embedding_server.requests == [["c"]]
+    assert vectors == [fake_vector(text) for text in ("a", "b", "c")]
+    assert (hits, misses) == (2, 1)
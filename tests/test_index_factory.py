@@ -0,0 +1,33 @@
+import faiss
+import numpy as np
+import pytest
+
+from core.index_factory import build_index, index_nbytes, index_type_of
+
+VECTORS = np.random.default_rng(0).random((3000, 16), dtype=np.float32)
+
+
+@pytest.mark.parametrize("index_type", ["flat", "hnsw", "ivf_flat", "ivf_sq"])
+def test_index_nbytes_matches_the_serialized_size(index_type):
+    index = build_index(VECTORS, index_type)
+
+    assert index_nbytes(index) == pytest.approx(faiss.serialize_index(index).nbytes, rel=0.02)
+
+
+def test_index_nbytes_counts_pq_codes_and_codebook():
+    # 4-bit codes: trains in milliseconds, where 8-bit codebooks take seconds per subquantizer
+    index = faiss.IndexIVFPQ(faiss.IndexFlatL2(16), 16, 32, 4, 4)
+    index.train(VECTORS)
+    index.add(VECTORS)
+
+    assert index_nbytes(index) == pytest.approx(faiss.serialize_index(index).nbytes, rel=0.02)
+
+
+@pytest.mark.parametrize("n, index_type, nbits", [(20, "ivf_pq", 4), (100, "ivf_pq", 6), (10, "ivf_sq", None)])
+def test_ivf_pq_adapts_to_small_corpora(n, index_type, nbits):
+    # 4 dimensions (so 4 subquantizers) keep PQ training quick
+    index = faiss.downcast_index(build_index(VECTORS[:n, :4], "ivf_pq"))
+
+    assert index_type_of(index) == index_type and index.ntotal == n
+    if nbits:
+        assert index.pq.nbits == nbits
@@ -0,0 +1,144 @@
+import os
+import shutil
+
+import pytest
+
+from benchmarks.corpus import generate_corpus
+from core.manifest import Manifest
+from core.retrievers import dense_search
+
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat")
+DOCSTORES = ("pickle", "sqlite")
+
+
+def _document(tmp_path, name: str, seed: int) -> str:
+    """Writes a ~20k character text file (about five chunks) and returns its path."""
+    path = generate_corpus(str(tmp_path / "sources" / name), 1, words_per_doc=3000, seed=seed)[0]
+    target = str(tmp_path / f"{name}.txt")
+    shutil.move(path, target)
+    return target
+
+
+def _assert_consistent(rag, project_id: str, store=None):
+    """Every manifest chunk is mapped exactly once, below ntotal, and is its own nearest neighbour."""
+    store_path = rag.get_vector_store_path(project_id)
+    store = store or rag.load_vector_store(store_path)
+    id_map = dict(store.index_to_docstore_id.items())
+    referenced = Manifest.load(store_path).referenced_ids()
+
+    assert all(0 <= position < store.index.ntotal for position in id_map)
+    assert sorted(id_map.values()) == sorted(referenced)
+    for doc_id in referenced:
+        doc = store.docstore.search(doc_id)
+        assert dense_search(store, doc.page_content, 1)[0][0] == doc_id
+
+
+@pytest.fixture(params=[(docstore, index_type) for docstore in DOCSTORES for index_type in INDEX_TYPES],
+                ids=lambda p: "-".join(p))
+def backend(request, rag_env):
+    docstore, index_type = request.param
+    rag_env.config["docstore"] = docstore
+    rag_env.config["index_type"] = index_type
+    return rag_env
+
+
+def test_add_after_delete_with_tombstones(backend, tmp_path):
+    rag = backend
+    rag.config["compact_threshold"] = 1.0  # Keep the tombstones
+    a, b, c = (_document(tmp_path, name, seed) for seed, name in enumerate("abc"))
+
+    assert rag.ingest_files("p", [a, b])
+    assert rag.delete_documents("p", ["a.txt"])
+    assert rag.ingest_files("p", [c])
+
+    _assert_consistent(rag, "p")
+    assert set(rag.list_documents("p")) == {"b.txt", "c.txt"}
+
+
+def test_add_after_compacting_delete(backend, tmp_path):
+    rag = backend
+    rag.config["compact_threshold"] = 0.0  # Compact on every delete
+    a, b, c = (_document(tmp_path, name, seed) for seed, name in enumerate("abc"))
+
+    assert rag.ingest_files("p", [a, b])
+    assert rag.delete_documents("p", ["a.txt"])
+    store = rag.load_vector_store(rag.get_vector_store_path("p"))
+    assert store.index.ntotal == len(store.index_to_docstore_id)
+    assert rag.ingest_files("p", [c])
+
+    _assert_consistent(rag, "p")
+
+
+def test_open_readers_are_unaffected_by_a_compacting_delete(backend, tmp_path):
+    rag = backend
+    rag.config["compact_threshold"] = 0.0
+    a, b = (_document(tmp_path, name, seed) for seed, name in enumerate("ab"))
+    assert rag.ingest_files("p", [a, b])
+    reader = rag.load_vector_store(rag.get_vector_store_path("p"))
+    kept = Manifest.load(rag.get_vector_store_path("p")).files["b.txt"]["chunk_ids"]
+    texts = {doc_id: reader.docstore.search(doc_id).page_content for doc_id in kept}
+
+    assert rag.delete_documents("p", ["a.txt"])
+
+    for doc_id, text in texts.items():
+        assert dense_search(reader, text, 1)[0][0] == doc_id
+    _assert_consistent(rag, "p")
+
+
+@pytest.mark.parametrize("index_type", INDEX_TYPES)
+def test_interrupted_save_falls_back_to_the_id_map_of_the_index_on_disk(rag_env, tmp_path, index_type):
+    rag = rag_env
+    rag.config.update(docstore="sqlite", index_type=index_type, compact_threshold=0.0)
+    a, b = (_document(tmp_path, name, seed) for seed, name in enumerate("ab"))
+    assert rag.ingest_files("p", [a, b])
+    store_path = rag.get_vector_store_path("p")
+    kept = Manifest.load(store_path).files["b.txt"]["chunk_ids"]
+    with open(os.path.join(store_path, "index.faiss"), "rb") as f:
+        old_index = f.read()
+
+    assert rag.delete_documents("p", ["a.txt"])
+    # Simulate a crash after index.pkl was replaced but before index.faiss was
+    with open(os.path.join(store_path, "index.faiss"), "wb") as f:
+        f.write(old_index)
+
+    store = rag._load_from_disk(store_path)
+    for doc_id in kept:
+        doc = store.docstore.search(doc_id)
+        assert dense_search(store, doc.page_content, 1)[0][0] == doc_id
+
+
+def test_superseded_id_map_tables_are_dropped(rag_env, tmp_path):
+    rag = rag_env
+    rag.config.update(docstore="sqlite", index_type="hnsw", compact_threshold=0.0)
+    paths = [_document(tmp_path, name, seed) for seed, name in enumerate("abcd")]
+    for path in paths:
+        assert rag.ingest_files("p", [path])
+    assert rag.delete_documents("p", ["a.txt", "b.txt"])
+
+    store = rag.load_vector_store(rag.get_vector_store_path("p"))
+    # The current map and the one saved before it
+    assert set(store.index_to_docstore_id._generations().values()) == {store.index_to_docstore_id.table, store.index_to_docstore_id.previous[0]}
+
+
+@pytest.mark.parametrize("index_type", INDEX_TYPES)
+def test_retry_after_a_failed_ingest_embeds_the_chunks_it_left_behind(rag_env, tmp_path, monkeypatch, index_type):
+    rag = rag_env
+    rag.config.update(docstore="sqlite", index_type=index_type)
+    a, b = (_document(tmp_path, name, seed) for seed, name in enumerate("ab"))
+    assert rag.ingest_files("p", [a])
+
+    # Fails after b's chunk rows were written but before the index mapping them was saved
+    def crash(vector_store, store_path):
+        raise OSError("disk full")
+    with monkeypatch.context() as patch:
+        patch.setattr(rag, "save_vector_store", crash)
+        assert not rag.ingest_files("p", [b])
+    store = rag.load_vector_store(rag.get_vector_store_path("p"))
+    assert len(store.docstore) > len(store.index_to_docstore_id)
+    assert len(list(rag.iter_store_documents(store))) == len(store.index_to_docstore_id)
+
+    assert rag.ingest_files("p", [b])
+
+    store = rag.load_vector_store(rag.get_vector_store_path("p"))
+    assert len(store.docstore) == len(store.index_to_docstore_id) == store.index.ntotal
+    _assert_consistent(rag, "p")
@@ -0,0 +1,54 @@
+import json
+import sqlite3
+import time
+
+from core.jobs import DELETE, DONE, FAILED, JobQueue
+
+
+def _wait(queue: JobQueue, job_id: str) -> dict:
+    for _ in range(200):
+        job = queue.get(job_id)
+        if job["status"] in (DONE, FAILED):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_delete_jobs_run_in_the_workers_and_keep_their_names(tmp_path):
+    deleted, ingested = [], []
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"), num_workers=1)
+    upload = tmp_path / "uploads" / "a.txt"
+    upload.parent.mkdir()
+    upload.write_text("revenue")
+    queue.start(lambda project, paths, on_progress: ingested.append((project, paths)) or True,
+                lambda project, names: deleted.append((project, names)) or True)
+
+    ingest_job = _wait(queue, queue.enqueue("p", [str(upload)]))
+    delete_job = _wait(queue, queue.enqueue("p", ["a.txt"], kind=DELETE))
+
+    assert ingested == [("p", [str(upload)])] and deleted == [("p", ["a.txt"])]
+    assert ingest_job["status"] == delete_job["status"] == DONE
+    assert delete_job["message"] == "Removed a.txt."
+    assert not upload.exists()
+
+
+def test_a_failed_delete_is_reported(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"), num_workers=1)
+    queue.start(lambda project, paths, on_progress: True, lambda project, names: False)
+
+    job = _wait(queue, queue.enqueue("p", ["a.txt"], kind=DELETE))
+
+    assert job["status"] == FAILED and "a.txt" in job["message"]
+
+
+def test_queues_from_before_delete_jobs_are_upgraded(tmp_path):
+    path = str(tmp_path / "jobs.sqlite")
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "CREATE TABLE jobs (id TEXT PRIMARY KEY, project TEXT NOT NULL, files TEXT NOT NULL,"
+            " status TEXT NOT NULL, progress REAL NOT NULL DEFAULT 0, message TEXT NOT NULL DEFAULT '',"
+            " created REAL NOT NULL, updated REAL NOT NULL)"
+        )
+        conn.execute("INSERT INTO jobs VALUES ('old', 'p', ?, 'queued', 0, '', 0, 0)", (json.dumps(["a.pdf"]),))
+
+    assert JobQueue(path).get("old")["kind"] == "ingest"
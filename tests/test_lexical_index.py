@@ -0,0 +1,60 @@
+import numpy as np
+
+from core.lexical_index import BM25Index
+
+
+def _docs(n: int, seed: int = 0) -> dict[str, str]:
+    rng = np.random.default_rng(seed)
+    words = [f"w{i}" for i in range(50)] + ["EBITDA-margin", "MSFT", "clause-4.2"]
+    return {f"d{i}": " ".join(rng.choice(words, rng.integers(5, 40))) for i in range(n)}
+
+
+def _arrays(index: BM25Index):
+    index.search("w1", 1)  # Merges any buffered postings
+    return index.doc_ids, index.indptr.tolist(), index.post_docs.tolist(), index.post_tfs.tolist(), index.doc_len.tolist()
+
+
+def test_batched_adds_match_a_single_add():
+    docs = _docs(300)
+    items = list(docs.items())
+    batched = BM25Index()
+    for start in range(0, len(items), 32):
+        batched.add(dict(items[start:start + 32]))
+        if start == 128:
+            batched.search("w3 MSFT", 5)  # A merge part-way through the adds
+    single = BM25Index()
+    single.add(docs)
+
+    assert _arrays(batched) == _arrays(single)
+    for query in ("w1 w2", "EBITDA-margin MSFT", "clause-4.2 w49"):
+        assert batched.search(query, 10) == single.search(query, 10)
+
+
+def test_remove_after_buffered_adds_matches_an_index_without_the_removed_docs():
+    docs = _docs(200, seed=1)
+    removed = {f"d{i}" for i in range(0, 200, 7)}
+    index = BM25Index()
+    items = list(docs.items())
+    index.add(dict(items[:100]))
+    index.search("w1", 1)
+    index.add(dict(items[100:]))
+    index.remove(removed)
+    expected = BM25Index()
+    expected.add({doc_id: text for doc_id, text in docs.items() if doc_id not in removed})
+
+    # Term numbering differs (removed documents introduced terms first), so compare results
+    assert index.doc_ids == expected.doc_ids
+    for query in ("w1 w2", "EBITDA-margin MSFT", "clause-4.2 w49"):
+        assert index.search(query, 20) == expected.search(query, 20)
+
+
+def test_copies_do_not_see_later_adds(tmp_path):
+    index = BM25Index()
+    index.add(_docs(50))
+    clone = index.copy()
+    clone.add({"new": "w1 w1 w1 MSFT"})
+
+    assert "new" not in [doc_id for doc_id, _ in index.search("w1 MSFT", 100)]
+    assert clone.search("w1 MSFT", 1)[0][0] == "new"
+    clone.save(str(tmp_path))
+    assert BM25Index.load(str(tmp_path)).search("w1 MSFT", 1)[0][0] == "new"
@@ -0,0 +1,139 @@
+import pytest
+
+from agents.map_reduce import NeedsConfirmation
+from benchmarks.fakes import FakeChatModel
+from core.chunk_store import SQLiteDocstore
+from test_index_updates import _document
+
+
+@pytest.fixture(params=["pickle", "sqlite"])
+def tools(request, rag_env, tmp_path, monkeypatch):
+    """The map-reduce tools over rag_env, with the given docstore and a map cache of their own."""
+    from agents import agent_logic, map_reduce
+
+    rag_env.config["docstore"] = request.param
+    monkeypatch.setitem(rag_env.config, "map_max_chunks", rag_env.config["map_max_chunks"])
+    monkeypatch.setattr(map_reduce, "_map_cache", map_reduce.MapCache(str(tmp_path / "map_cache.sqlite")))
+    return agent_logic
+
+
+class CountingChatModel(FakeChatModel):
+    calls: list = []
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls.append(messages)
+        return super()._generate(messages, stop, run_manager, **kwargs)
+
+
+@pytest.fixture
+def llm():
+    return CountingChatModel(ttft=0.0, token_latency=0.0, n_tokens=8)
+
+
+def _counting(chunks, loaded: list):
+    """Wraps each ChunkRef's loader to record the hashes whose text is loaded."""
+    def loader(ref):
+        def load():
+            loaded.append(ref.chunk_hash)
+            return ref.load()
+        return load
+    return [ref._replace(load=loader(ref)) for ref in chunks]
+
+
+def test_chunks_are_listed_by_hash_without_loading_text(tools, tmp_path, monkeypatch):
+    from core import rag
+
+    assert rag.ingest_files("p", [_document(tmp_path, "a", 0)])
+    store = rag.load_vector_store(rag.get_vector_store_path("p"))
+    stored = {doc.metadata["chunk_hash"]: doc for _, doc in rag.iter_store_documents(store)}
+    searches = []
+    monkeypatch.setattr(SQLiteDocstore, "search", lambda self, doc_id: searches.append(doc_id))
+
+    chunks = list(rag.iter_store_chunks(store))
+
+    assert not searches
+    assert sorted(ref.chunk_hash for ref in chunks) == sorted(stored)
+    assert all(ref.metadata == stored[ref.chunk_hash].metadata for ref in chunks)
+
+
+def test_only_chunks_without_cached_outputs_are_loaded(tools, llm, tmp_path):
+    from core import rag
+
+    assert rag.ingest_files("p", [_document(tmp_path, "a", 0)])
+    retriever = rag.get_retriever_for_project("p")
+    first, loaded = list(rag.iter_retriever_chunks(retriever)), []
+    tools.summarize(_counting(first, loaded), llm)
+    assert sorted(loaded) == sorted(ref.chunk_hash for ref in first)
+
+    assert rag.ingest_files("p", [_document(tmp_path, "b", 1)])
+    retriever = rag.get_retriever_for_project("p")
+    second, loaded = list(rag.iter_retriever_chunks(retriever)), []
+    summary = tools.summarize(_counting(second, loaded), llm)
+    assert sorted(loaded) == sorted({ref.chunk_hash for ref in second} - {ref.chunk_hash for ref in first})
+
+    loaded.clear()
+    assert tools.summarize(_counting(second, loaded), llm) == summary
+    assert not loaded
+
+
+def test_runs_over_the_chunk_limit_need_confirmation(tools, llm, tmp_path, monkeypatch):
+    from agents import map_reduce
+    from agents.tool_agent import execute_plan
+    from core import rag
+
+    assert rag.ingest_files("p", [_document(tmp_path, "a", 0)])
+    retriever = rag.get_retriever_for_project("p")
+    n_chunks = len(list(rag.iter_retriever_chunks(retriever)))
+    rag.config["map_max_chunks"] = n_chunks - 1
+
+    for request in ("Summarize the documents", "Summarize the confirmed orders"):
+        (_, result), = execute_plan(request, ["summarize"], retriever, llm, {})
+        assert isinstance(result, NeedsConfirmation) and not llm.calls
+
+    (_, result), = execute_plan("Summarize the documents, confirm", ["summarize"], retriever, llm, {})
+    assert not isinstance(result, NeedsConfirmation) and len(llm.calls) > n_chunks  # A map call per chunk, then the reduce
+
+    monkeypatch.setattr(map_reduce, "_map_cache", map_reduce.MapCache(str(tmp_path / "empty_map_cache.sqlite")))
+    (_, result), = execute_plan("Summarize the documents", ["summarize"], retriever, llm, {}, confirm=True)
+    assert not isinstance(result, NeedsConfirmation)
+
+
+def test_decide_and_act_returns_a_request_to_confirm(tools, llm, tmp_path):
+    from agents.tool_agent import decide_and_act
+    from core import rag
+
+    assert rag.ingest_files("p", [_document(tmp_path, "a", 0)])
+    retriever = rag.get_retriever_for_project("p")
+    rag.config["map_max_chunks"] = 1
+
+    response = decide_and_act("Summarize the documents", None, retriever, llm, {})
+
+    assert isinstance(response, NeedsConfirmation) and "confirm" in response
+
+
+def test_federated_chunks_name_their_project(tools, tmp_path):
+    from core import rag
+
+    assert rag.ingest_files("p", [_document(tmp_path, "a", 0)])
+    assert rag.ingest_files("q", [_document(tmp_path, "b", 1)])
+    chunks = list(rag.iter_retriever_chunks(rag.get_federated_retriever(["p", "q"])))
+
+    projects = {project_id: len(list(rag.iter_retriever_chunks(rag.get_retriever_for_project(project_id)))) for project_id in "pq"}
+    assert {project_id: sum(ref.metadata["project"] == project_id for ref in chunks) for project_id in "pq"} == projects
+    assert all(isinstance(ref.load(), str) for ref in chunks)
+
+
+def test_streamed_tool_turns_stream_the_final_reduce(tools, llm, tmp_path):
+    from agents.tool_agent import decide_and_act, stream_decide_and_act
+    from core import rag
+
+    assert rag.ingest_files("p", [_document(tmp_path, "a", 0)])
+    retriever = rag.get_retriever_for_project("p")
+    timings = {}
+
+    parts = list(stream_decide_and_act("Summarize the documents", None, retriever, llm, timings))
+
+    assert parts[0] == "### Summarize Result:\n" and parts[-1] == "\n\n"
+    assert len(parts) == llm.n_tokens + 2  # The reduce call's tokens, one by one
+    assert "".join(parts) == decide_and_act("Summarize the documents", None, retriever, llm)
+    assert timings["summarize"] > 0
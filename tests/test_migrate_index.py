@@ -0,0 +1,45 @@
+import threading
+
+import pytest
+
+from core import migrate_index
+from core.index_factory import index_type_of
+from core.locks import project_write_lock
+from test_index_updates import _assert_consistent, _document
+
+
+@pytest.mark.parametrize("docstore", ["pickle", "sqlite"])
+def test_migration_leaves_open_readers_on_the_old_index(rag_env, tmp_path, docstore):
+    rag = rag_env
+    rag.config.update(docstore=docstore, index_type="flat", compact_threshold=1.0)
+    a, b = (_document(tmp_path, name, seed) for seed, name in enumerate("ab"))
+    assert rag.ingest_files("p", [a, b])
+    assert rag.delete_documents("p", ["a.txt"])  # Leaves tombstones for the migration to compact
+    store_path = rag.get_vector_store_path("p")
+    reader = rag.load_vector_store(store_path)
+    reader_map = dict(reader.index_to_docstore_id.items())
+
+    assert migrate_index.migrate_project("p", "hnsw", k=5, docstore="sqlite" if docstore == "pickle" else "pickle")
+
+    assert index_type_of(reader.index) == "flat"
+    assert dict(reader.index_to_docstore_id.items()) == reader_map
+    migrated = rag.load_vector_store(store_path)
+    assert migrated is not reader
+    assert index_type_of(migrated.index) == "hnsw"
+    _assert_consistent(rag, "p", migrated)
+
+
+def test_migration_waits_for_the_project_write_lock(rag_env, tmp_path):
+    rag = rag_env
+    assert rag.ingest_files("p", [_document(tmp_path, "a", 0)])
+    store_path = rag.get_vector_store_path("p")
+    finished = threading.Event()
+
+    with project_write_lock(store_path):
+        thread = threading.Thread(target=lambda: (migrate_index.migrate_project("p", "hnsw", k=5), finished.set()))
+        thread.start()
+        assert not finished.wait(0.5)
+    thread.join(30)
+
+    assert finished.is_set()
+    assert index_type_of(rag.load_vector_store(store_path).index) == "hnsw"
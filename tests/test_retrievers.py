@@ -0,0 +1,174 @@
+import gc
+import os
+import subprocess
+import sys
+import weakref
+
+import pytest
+from langchain_core.documents import Document
+
+from core.manifest import Manifest
+from test_index_updates import _document
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_retriever_serves_the_latest_index_without_holding_a_store(rag_env, tmp_path):
+    rag = rag_env
+    store_path = rag.get_vector_store_path("p")
+    assert rag.ingest_files("p", [_document(tmp_path, "a", 0)])
+    retriever = rag.get_retriever_for_project("p")
+    old_store = weakref.ref(rag.load_vector_store(store_path))
+
+    assert rag.ingest_files("p", [_document(tmp_path, "b", 1)])
+    rag.store_cache.invalidate(store_path)
+    gc.collect()
+    assert old_store() is None
+
+    added = Manifest.load(store_path).files["b.txt"]["chunk_ids"][0]
+    text = rag.load_vector_store(store_path).docstore.search(added).page_content
+    assert text in [doc.page_content for doc in retriever.invoke(text)]
+
+
+def test_retriever_of_a_deleted_index_returns_nothing(rag_env, tmp_path):
+    rag = rag_env
+    assert rag.ingest_files("p", [_document(tmp_path, "a", 0)])
+    retriever = rag.get_retriever_for_project("p")
+    os.remove(os.path.join(rag.get_vector_store_path("p"), "index.faiss"))
+
+    assert retriever.invoke("revenue") == []
+    assert list(rag.iter_retriever_chunks(retriever)) == []
+
+
+def test_importing_rag_creates_no_files(tmp_path):
+    env = {**os.environ, "PYTHONPATH": REPO_ROOT}
+    subprocess.run([sys.executable, "-c", "import core.rag, agents.agent_logic"], cwd=tmp_path, env=env, check=True, capture_output=True)
+    assert os.listdir(tmp_path) == []
+
+
+def test_a_store_over_the_cache_budget_is_loaded_once(rag_env, tmp_path, monkeypatch):
+    from core.store_cache import StoreCache
+
+    rag = rag_env
+    monkeypatch.setattr(rag, "store_cache", StoreCache(1000))
+    assert rag.ingest_files("p", [_document(tmp_path, "a", 0)])
+    rag.store_cache.invalidate(rag.get_vector_store_path("p"))
+    loads = []
+    load_from_disk = rag._load_from_disk
+    monkeypatch.setattr(rag, "_load_from_disk", lambda store_path: loads.append(store_path) or load_from_disk(store_path))
+
+    retriever = rag.get_retriever_for_project("p")
+    for query in ("revenue", "EBITDA margin", "clause 4.2"):
+        assert retriever.invoke(query)
+    assert len(loads) == 1
+
+
+def test_an_unpinned_store_is_found_while_still_referenced(rag_env, tmp_path, monkeypatch):
+    from core.store_cache import StoreCache
+
+    rag = rag_env
+    monkeypatch.setattr(rag, "store_cache", StoreCache(1000))
+    assert rag.ingest_files("p", [_document(tmp_path, "a", 0)])
+    assert rag.ingest_files("q", [_document(tmp_path, "b", 1)])
+    held = rag.load_vector_store(rag.get_vector_store_path("p"))
+    rag.load_vector_store(rag.get_vector_store_path("q"))  # Takes the pin over from p
+
+    assert rag.load_vector_store(rag.get_vector_store_path("p")) is held
+
+
+def test_embeddings_are_marked_ready_only_once_set(rag_env, monkeypatch):
+    from benchmarks.fakes import FakeEmbeddings
+
+    rag = rag_env
+    monkeypatch.setattr(rag, "embeddings", None)
+    monkeypatch.setattr(rag, "_embeddings_initialized", False)
+    monkeypatch.setattr(rag, "EmbeddingEngine", lambda *args, **kwargs: 1 / 0)
+
+    with pytest.raises(ZeroDivisionError):
+        rag.set_embeddings(FakeEmbeddings(dim=32))
+    assert not rag._embeddings_initialized and rag.embeddings is None
+
+
+class _Shard:
+    """Stand-in shard with fixed dense (id, distance) and lexical (id, BM25 score) hits."""
+
+    vector_store = "store"
+
+    def __init__(self, dense, lexical=()):
+        self.dense, self.lexical = list(dense), list(lexical)
+        self.docs = {doc_id: Document(page_content=f"text of {doc_id}", metadata={"source": f"{doc_id}.txt"}) for doc_id, _ in self.dense + self.lexical}
+        self.query_vectors = []
+
+    def candidates(self, vector_store, query, query_vector=None):
+        self.query_vectors.append(query_vector)
+        return self.dense, self.lexical
+
+    def fetch(self, vector_store, doc_ids):
+        return {doc_id: self.docs[doc_id] for doc_id in doc_ids if doc_id in self.docs}
+
+
+def _federated(shards: dict, k: int = 4, embed_query=lambda query: [0.5, 0.5]):
+    from core.retrievers import FederatedRetriever
+
+    return FederatedRetriever(shards=shards, embed_query=embed_query, k=k)
+
+
+def test_federated_dense_hits_are_ranked_across_shards_by_distance():
+    retriever = _federated({"p": _Shard([("a", 0.1), ("b", 0.5)]), "q": _Shard([("c", 0.2), ("d", 0.9)])})
+
+    assert [doc.id for doc in retriever.invoke("revenue")] == ["a", "c", "b", "d"]
+
+
+def test_federated_bm25_scores_are_normalized_per_shard():
+    # p's corpus gives far larger raw BM25 scores; divided by each shard's best they compare fairly
+    retriever = _federated({"p": _Shard([], [("a", 40.0), ("b", 8.0)]), "q": _Shard([], [("c", 2.0), ("d", 1.9)])})
+
+    ranked = [doc.id for doc in retriever.invoke("EBITDA")]
+
+    assert set(ranked[:2]) == {"a", "c"} and ranked[2:] == ["d", "b"]
+
+
+def test_federated_hits_are_tagged_with_their_project_without_touching_the_shard():
+    shards = {"p": _Shard([("a", 0.1)]), "q": _Shard([("a", 0.2)])}
+
+    docs = _federated(shards).invoke("revenue")
+
+    assert [(doc.metadata["project"], doc.id, doc.page_content) for doc in docs] == [("p", "a", "text of a"), ("q", "a", "text of a")]
+    assert all("project" not in doc.metadata for shard in shards.values() for doc in shard.docs.values())
+
+
+def test_federated_query_is_embedded_once_for_every_shard():
+    calls = []
+    shards = {project: _Shard([(f"{project}1", 0.1)]) for project in ("p", "q", "r")}
+
+    _federated(shards, embed_query=lambda query: calls.append(query) or [0.5, 0.5]).invoke("revenue")
+
+    assert calls == ["revenue"]
+    assert all(shard.query_vectors == [[0.5, 0.5]] for shard in shards.values())
+
+
+def test_federated_search_embeds_with_the_shared_client_not_per_store(rag_env, tmp_path, monkeypatch):
+    from langchain_community.vectorstores import FAISS
+
+    rag = rag_env
+    assert rag.ingest_files("p", [_document(tmp_path, "a", 0)])
+    assert rag.ingest_files("q", [_document(tmp_path, "b", 1)])
+    monkeypatch.setattr(FAISS, "_embed_query", lambda self, text: pytest.fail("a shard embedded the query"))
+
+    docs = rag.get_federated_retriever(["p", "q"]).invoke("revenue")
+
+    assert {doc.metadata["project"] for doc in docs} == {"p", "q"}
+
+
+def test_missing_shards_are_left_out(rag_env, tmp_path):
+    rag = rag_env
+    assert rag.ingest_files("p", [_document(tmp_path, "a", 0)])
+    assert rag.ingest_files("q", [_document(tmp_path, "b", 1)])
+
+    assert rag.get_federated_retriever(["x", "y"]) is None
+    retriever = rag.get_federated_retriever(["p", "x", "q"])
+    assert set(retriever.shards) == {"p", "q"}
+
+    os.remove(os.path.join(rag.get_vector_store_path("q"), "index.faiss"))
+    docs = retriever.invoke("revenue")
+    assert docs and {doc.metadata["project"] for doc in docs} == {"p"}